@@ -1,11 +1,28 @@
-from util.ipa import arpabet_to_ipa
-from util.common import get_cmudict, remove_word_version, remove_phoneme_stress, normalize_quotes
+from util.ipa import encode_arpabet, decode_ipa, count_slips, phonemes as ipa_phonemes
+from util.common import remove_word_version, normalize_quotes, clean_phrase
 from util.common import Color as C
-from g2p_en import G2p
-from difflib import SequenceMatcher
-
-
-g2p = G2p()  # intelligent g2p using ML (words -> ARPABET phonemes)
+from util.lexicon import Lexicon, SubstringIndex, get_lexicon
+from util.trie import PhonemeTrie, phoneme_similarity
+from util.ngram import BigramIndex, FeatureIndex
+from util.g2p import Pronouncer
+from util.batch import read_records, run_batch
+from util.trace import Tracer, SearchStats, Stopwatch, SILENT
+from util.budget import Budget, BudgetExceeded
+from util.cost import CostModel
+from util.lattice import WordLattice
+from util.cache import SegmentationCache
+from util.document import split_clauses, document_pieces, search_pieces
+from util.server import ConfabulationServer
+from util.speculate import speculative_branches, search_branches
+from util.bench import bench
+from heapq import heappush, heappop
+from contextlib import redirect_stdout
+from functools import lru_cache
+from itertools import chain, islice
+import argparse
+import asyncio
+import sys
+import numpy as np
 
 
 def smart_phonetic_match(word_phonemes: list[str], remaining_phonemes: list[str], errors: int = 1) -> bool:
@@ -14,89 +31,584 @@ def smart_phonetic_match(word_phonemes: list[str], remaining_phonemes: list[str]
     if len(word_phonemes) > len(remaining_phonemes):
         return False
 
-    # convert ARPABET phonemes to IPA phonemes
-    word_ipa = arpabet_to_ipa(word_phonemes)
-    comparison_ipa = arpabet_to_ipa(remaining_phonemes[:len(word_phonemes)])
-
-    slips = 0  # 4 * abs(len(word_ipa) - len(comparison_ipa))
-    differences = {}
-    for i in range(min(len(word_ipa), len(comparison_ipa))):  # iterate over phonemes
-        difference = set(word_ipa[i].descriptors) ^ set(comparison_ipa[i].descriptors)  # difference between phonemes
-        if difference:
-            differences[i] = difference
-
-            # TODO: modify to punish larger differences more, e.g. "gestures":"gestured" is worse than "gestures":"jesters"
-            slips += len(difference) / 2  # add the number of differences to the slip count
+    # convert ARPABET phonemes to IPA character codes
+    word_codes = encode_arpabet(word_phonemes)
+    comparison_codes = encode_arpabet(remaining_phonemes[:len(word_phonemes)])
 
-            # if the number of slips is greater than the number of allowed errors, it's not a match
-            if slips > errors:
-                return False
+    # every differing descriptor between two IPA characters is half a slip
+    # TODO: modify to punish larger differences more, e.g. "gestures":"gestured" is worse than "gestures":"jesters"
+    # if the number of slips is greater than the number of allowed errors, it's not a match
+    if count_slips(word_codes, comparison_codes, 0, len(comparison_codes), 2 * errors) > 2 * errors:
+        return False
 
     # if it gets through all the phonemes, it's a match!
-    print(f'{C.GREEN}+ Matched: {comparison_ipa} -> {word_ipa} | {differences} {C.END}')
     return True
 
+def describe_smart_match(word_codes: tuple[int, ...], comparison_codes: tuple[int, ...]) -> dict:
+    """ the trace fields showing which IPA characters differ between a smart match and the phonemes it replaces """
+    return {
+        'comparison_ipa': decode_ipa(comparison_codes),
+        'word_ipa': decode_ipa(word_codes),
+        'differences': {i: set(ipa_phonemes[a].descriptors ^ ipa_phonemes[b].descriptors) for i, (a, b) in enumerate(zip(word_codes, comparison_codes)) if ipa_phonemes[a].bits != ipa_phonemes[b].bits},
+    }
+
 def fuzzy_phonetic_match(word_phonemes: list[str], remaining_phonemes: list[str], creativity: float = 0.1) -> bool:
-    """ use basic sequence matching to match the first phonemes in the list """
-    return SequenceMatcher(None, word_phonemes, remaining_phonemes[:len(word_phonemes)]).ratio() >= 1 - creativity
+    """ use basic sequence matching (see `phoneme_similarity`) to match the first phonemes in the list """
+    return phoneme_similarity(word_phonemes, remaining_phonemes[:len(word_phonemes)]) >= 1 - creativity
 
 def strict_phonetic_match(word_phonemes: list[str], remaining_phonemes: list[str]) -> bool:
     """ check if the word's phonemes exactly match the first phonemes in the list """
     return word_phonemes == remaining_phonemes[:len(word_phonemes)]
 
-# runs in O(n^2) time at worst case, usually O(n)!
-def confabulate(phrase: str, word_to_phoneme: dict, match_function) -> str:
-    """ given a phrase, return a confabulated list of words that possess the same phonemes """
-    words = normalize_quotes(phrase).lower().split(' ')  # split phrase into words
-    phoneme_chunks = [(word, remove_phoneme_stress(g2p(word))) for word in words]  # get phonemes for each word, remove stresses
-    all_phonemes = [phoneme for word, phonemes in phoneme_chunks for phoneme in phonemes]  # flatten phoneme chunks to arbitrary phonemes
-    print(f'{C.CYAN}@@ Split phonemes: {all_phonemes} @@{C.END}')
-
-    # sort the CMU dict to prefer longer words that aren't in the original phrase
-    cmu_dict_list = list(word_to_phoneme.items())
-    cmu_dict_list.sort(key=lambda x: len(x[1]), reverse=True)  # prefer longer words first
-    cmu_dict_list = [(word, remove_phoneme_stress(phonemes)) for word, phonemes in cmu_dict_list if not any(starting_word in word for starting_word in words)] + phoneme_chunks  # move the original words to the list of words to search through (prefer new words)
-    print(f'{C.CYAN}@@ Running on a sorted CMU Dictionary of {len(cmu_dict_list)} words! @@{C.END}')
-
-    def find_next_word(found_words: list[str], remaining_phonemes: list[str]) -> list[str] or None:
-        """ recursive search for a next word that matches the remaining phonemes """
-        print(f'{C.GREEN}+ Finding: {found_words} + {remaining_phonemes}{C.END}')
-        if not remaining_phonemes:  # if there are no remaining phonemes, then we have found a valid solution!
+MATCH_FUNCTIONS = {'smart': smart_phonetic_match, 'fuzzy': fuzzy_phonetic_match, 'strict': strict_phonetic_match}
+STRATEGIES = ('first', 'best')
+
+class Confabulation:
+    """ the result of one search: the words found, the text they read as, and how the search went """
+
+    def __init__(self, words: list[str], stats: SearchStats, degraded: bool = False, cost: float or None = None):
+        self.words = words
+        self.text = remove_word_version(' '.join(words).lower())  # filter out 'alternate word' notation, i.e. "reap what you sow(1)"
+        self.stats = stats
+        self.degraded = degraded  # True if the search gave up and kept some of the original words instead
+        self.cost = cost  # under the engine's cost model, for best-first searches
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'Confabulation({self.text!r}, {self.stats!r}, degraded={self.degraded})'
+
+class Confabulator:
+    """
+    Prepares the sorted, stress-free lexicon and its search indexes once, then confabulates any number of phrases.
+    The indexes for each match function are only built the first time that match function is used.
+    """
+
+    def __init__(self, lexicon: Lexicon or dict, match_function=strict_phonetic_match, tracer: Tracer = None, budget: Budget = None,
+                 strategy: str = 'first', cost_model: CostModel = None, cache: SegmentationCache = None):
+        if not isinstance(lexicon, Lexicon):
+            lexicon = Lexicon.from_cmudict(lexicon)  # sort the CMU dict to prefer longer pronunciations, and remove stresses
+        self.lexicon = lexicon
+        self.match_function = match_function
+        self.tracer = tracer or Tracer()  # prints the whole search unless told otherwise
+        self.budget = budget or Budget()  # unlimited unless told otherwise
+        assert strategy in STRATEGIES, f'unknown search strategy {strategy!r}'
+        self.strategy = strategy
+        self.cost_model = cost_model or CostModel()  # for the 'best' strategy
+        self.cache = cache  # finished searches and suffixes, across phrases; none unless given one
+        # the lexicon stays in its (memory-mapped) buffers: the indexes are built straight from them, and an entry is only
+        # decoded into a (word, phonemes) pair once a search reaches it
+        self.longest = int(np.diff(lexicon.phoneme_arrays()[1]).max(initial=1))
+        self.entry_words = np.frombuffer(lexicon.entry_words, dtype=np.uint32)  # entry -> word id
+        self.entry = lru_cache(maxsize=8192)(self._entry)
+        self.substrings = SubstringIndex(lexicon.words, lexicon.word_offsets)  # to exclude the original words
+        self.pronouncer = Pronouncer(self.dictionary_phonemes)
+        self._trie = None
+        self._bigrams = None
+        self._features = None
+
+    def _entry(self, index: int) -> tuple[str, list[str]]:
+        """ (word, phonemes) of a lexicon entry; `entry` caches the ones searches keep coming back to """
+        return self.lexicon.word(index), self.lexicon.phonemes(index)
+
+    def dictionary_phonemes(self, word: str) -> list[str] or None:
+        """ the lexicon's phonemes for a word, if it has them """
+        word_id = self.lexicon.word_id(word)
+        return None if word_id is None else self.lexicon.phonemes(self.lexicon.pronunciations(word_id)[0])  # its usual pronunciation
+
+    @staticmethod
+    def split_words(phrase: str) -> list[str]:
+        """ split a phrase into the words `confabulate` works with """
+        return normalize_quotes(phrase).lower().split(' ')
+
+    def pronounce_phrases(self, phrases: list[str]):
+        """ look up (or predict, in one batch) the phonemes of every word in these phrases ahead of confabulating them """
+        self.pronouncer.pronounce_batch([word for phrase in phrases for word in self.split_words(phrase)])
+
+    @property
+    def trie(self) -> PhonemeTrie:
+        """ strict matches are exact prefixes, so only the words along the remaining phonemes' path in a trie can match """
+        if self._trie is None:
+            self._trie = PhonemeTrie(self.lexicon)
+        return self._trie
+
+    @property
+    def bigrams(self) -> BigramIndex:
+        """ fuzzy matches keep most of their phoneme bigrams, so only the words sharing enough of them with each offset are compared """
+        if self._bigrams is None:
+            self._bigrams = BigramIndex(self.lexicon)
+        return self._bigrams
+
+    @property
+    def features(self) -> FeatureIndex:
+        """ smart matches agree with the phrase's IPA features in all but a few positions, so only those words are scored """
+        if self._features is None:
+            self._features = FeatureIndex(self.lexicon)
+        return self._features
+
+    def prepare(self, match_function=None):
+        """ build the indexes a match function needs now rather than on first use, e.g. before forking workers """
+        match_function = match_function or self.match_function
+        if match_function is strict_phonetic_match:
+            self.trie
+        elif match_function is fuzzy_phonetic_match:
+            self.bigrams
+        elif match_function is smart_phonetic_match:
+            self.features
+
+    def matcher(self, phrase: str, match_function, stats: SearchStats):
+        """
+        everything a search over one phrase needs: the (word, phonemes) chunks of the phrase, all of its phonemes, and a
+        `matching_words(offset)` function for the words that fit each offset
+        """
+        tracer = self.tracer
+        with Stopwatch(stats, 'g2p_seconds'):
+            words = self.split_words(phrase)  # split phrase into words
+            phoneme_chunks = [(word, list(self.pronouncer.pronounce(word))) for word in words]  # get stress-free phonemes for each word
+        all_phonemes = [phoneme for word, phonemes in phoneme_chunks for phoneme in phonemes]  # flatten phoneme chunks to arbitrary phonemes
+        if tracer.info:
+            tracer.emit('phonemes', phonemes=all_phonemes)
+
+        # prefer words that aren't in the original phrase: skip any lexicon word containing one of them,
+        # and only fall back to the original words after every lexicon word (prefer new words)
+        excluded_words = np.zeros(self.lexicon.word_count, dtype=bool)
+        for word in set(words):
+            excluded_words[self.substrings.containing(word)] = True
+        excluded = excluded_words[self.entry_words]  # every pronunciation of an excluded word
+        if tracer.info:
+            tracer.emit('lexicon', words=len(self.lexicon) - int(excluded.sum()) + len(phoneme_chunks))
+
+        if match_function is smart_phonetic_match:
+            phrase_codes = np.array(encode_arpabet(all_phonemes), dtype=np.int32)
+            code_offsets = [0]  # phoneme offset -> offset into the phrase's IPA character codes
+            for phoneme in all_phonemes:
+                code_offsets.append(code_offsets[-1] + len(encode_arpabet([phoneme])))
+
+        def smart_matching_words(offset: int):
+            """ `matching_words` for smart matching, walking the lexicon entries that survived the feature index """
+            indices, costs = self.features.smart_scores(phrase_codes, code_offsets, offset)
+            kept = ~excluded[indices]
+            for index, slips in zip(indices[kept].tolist(), costs[kept].tolist()):
+                word, phonemes = self.entry(index)
+                if tracer.debug:
+                    tracer.emit('match', **describe_smart_match(encode_arpabet(phonemes), phrase_codes[code_offsets[offset]:code_offsets[offset + len(phonemes)]]))
+                yield word, phonemes, slips, False
+            for word, phonemes in phoneme_chunks:
+                end = offset + len(phonemes)
+                if end <= len(all_phonemes):
+                    slips = count_slips(encode_arpabet(phonemes), phrase_codes, code_offsets[offset], code_offsets[end], 2)
+                    if slips <= 2:
+                        if tracer.debug:
+                            tracer.emit('match', **describe_smart_match(encode_arpabet(phonemes), phrase_codes[code_offsets[offset]:code_offsets[end]]))
+                        yield word, phonemes, slips, True
+
+        def fuzzy_slips(phonemes: list[str], similarity: float) -> int:
+            """ phonemes inserted or deleted to turn a fuzzy match into the phonemes it replaces """
+            return round((1 - similarity) * 2 * len(phonemes))
+
+        def matching_words(offset: int):
+            """
+            yield (word, phonemes, slips, original) for the words that match the phonemes starting at `offset`, in
+            preference order, where `slips` is how far the word strays from the phrase and `original` is whether it's
+            one of the phrase's own words
+            """
+            stats.match_calls += 1
+            # a word only ever looks at as many phonemes as it has, so no match needs more than the longest word's worth
+            remaining_phonemes = all_phonemes[offset:offset + self.longest]
+            if match_function is strict_phonetic_match:
+                matches = ((index, 0) for index in self.trie.prefix_matches(all_phonemes, offset))
+            elif match_function is fuzzy_phonetic_match:
+                matches = ((index, fuzzy_slips(self.entry(index)[1], similarity)) for index, similarity in self.bigrams.fuzzy_matches(all_phonemes, offset))
+            elif match_function is smart_phonetic_match:
+                return smart_matching_words(offset)
+            else:  # the indexes already did the matching for the built-in match functions
+                matches = ((index, 0) for index in range(len(self.lexicon)) if not excluded[index] and match_function(self.lexicon.phonemes(index), remaining_phonemes))
+            lexicon_words = ((*self.entry(index), slips, False) for index, slips in matches if not excluded[index])
+            original_words = (
+                (word, phonemes, fuzzy_slips(phonemes, phoneme_similarity(phonemes, all_phonemes[offset:offset + len(phonemes)])) if match_function is fuzzy_phonetic_match else 0, True)
+                for word, phonemes in phoneme_chunks if match_function(phonemes, all_phonemes[offset:offset + len(phonemes)])
+            )
+            return chain(lexicon_words, original_words)
+
+        return phoneme_chunks, all_phonemes, matching_words
+
+    def cache_scope(self, match_function, strategy: str) -> list or None:
+        """
+        everything besides the phrase that a cached search depends on, or None if nothing is to be cached: without a cache,
+        or when that can't be told from the outside (a match function other than the `MATCH_FUNCTIONS`, or a `CostModel` subclass)
+        """
+        mode = next((mode for mode, function in MATCH_FUNCTIONS.items() if function is match_function), None)
+        if self.cache is None or mode is None or (strategy == 'best' and type(self.cost_model) is not CostModel):
+            return None
+        return [mode, strategy, vars(self.cost_model) if strategy == 'best' else None, self.lexicon.version.hex()]
+
+    def cached(self, phrase: str, match_function=None, strategy: str = None) -> Confabulation or None:
+        """ a finished search of the phrase from the cache, without pronouncing it, if there is one """
+        scope = self.cache_scope(match_function or self.match_function, strategy or self.strategy)
+        if scope is None:
+            return None
+        cached = self.cache.get(('phrase', scope, self.split_words(phrase)))
+        if cached is None:
+            return None
+        stats = SearchStats()
+        stats.cache_hits += 1
+        if self.tracer.info:
+            self.tracer.emit('cached', found_words=cached['words'])
+        return Confabulation(list(cached['words']), stats, cost=cached['cost'])
+
+    def cache_result(self, phrase: str, match_function, strategy: str or None, confabulation: Confabulation):
+        """ cache a finished search for `cached`; searches that ran out of budget aren't finished, so aren't kept """
+        scope = self.cache_scope(match_function or self.match_function, strategy or self.strategy)
+        if scope is not None and not confabulation.degraded:
+            self.cache.put(('phrase', scope, self.split_words(phrase)), {'words': list(confabulation.words), 'cost': confabulation.cost})
+
+    def confabulate(self, phrase: str, match_function=None) -> str:
+        """ given a phrase, return a confabulated list of words that possess the same phonemes """
+        return self.search(phrase, match_function).text
+
+    # every phoneme offset is searched at most once, so this runs in O(n * candidates) time at worst case
+    def search(self, phrase: str, match_function=None, budget: Budget = None, strategy: str = None, start: int = 0) -> Confabulation or None:
+        """
+        `confabulate`, keeping the words found and the search's counters. The 'first' strategy returns the first
+        segmentation a depth-first search finds, preferring longer words; 'best' returns the cheapest under the cost model.
+        With a `start` offset, only the phonemes from there on are searched depth-first (a branch of `search_speculative`):
+        the result holds just their words, or is None if they can't be found, and running out of budget raises.
+        """
+        match_function = match_function or self.match_function
+        strategy = strategy or self.strategy
+        assert not start or strategy == 'first', 'only depth-first searches can start part way through a phrase'
+        tracer = self.tracer
+        budget = budget or self.budget
+        deadline = budget.deadline()
+        stats = SearchStats()
+        scope = self.cache_scope(match_function, strategy)
+        cache = None if scope is None else self.cache
+        cached = None if start else self.cached(phrase, match_function, strategy)  # a phrase seen before needs neither its phonemes nor a search
+        if cached is not None:
+            return cached
+        phoneme_chunks, all_phonemes, matching_words = self.matcher(phrase, match_function, stats)
+        # the words that fit a suffix depend on nothing but the phrase's words and where it starts, so a suffix solved
+        # (or found unsolvable) by one search holds for any other search of the same words. A solved suffix is kept as
+        # a link to the word taken from it and the offset after that word, so no entry grows with the phrase
+        phrase_key = None if cache is None else cache.digest([scope, [word for word, phonemes in phoneme_chunks]]).hex()
+        suffix_key = lambda offset: ('suffix', phrase_key, offset)
+
+        # the words that fit a suffix only depend on where it starts, so a suffix that can't be solved from one
+        # offset can't be solved no matter which words came before it; remember those and never search them twice
+        unsolvable_offsets = set()
+
+        # if the budget runs out, the furthest the search got along a boundary between two of the original words is kept,
+        # and the original words finish the phrase from there
+        word_boundaries = {}  # phoneme offset -> index of the original word starting there
+        boundary = 0
+        for index, (word, phonemes) in enumerate(phoneme_chunks):
+            word_boundaries.setdefault(boundary, index)
+            boundary += len(phonemes)
+        best_partial = [0, []]  # offset, words found up to it
+
+        def cached_suffix(offset: int) -> list[str] or bool or None:
+            """ the words solving the suffix from `offset`, following its cached links; False if it's unsolvable, None if unknown """
+            words = []
+            while offset != len(all_phonemes):
+                link = cache.get(suffix_key(offset))
+                if not link:
+                    return None if words else link  # a chain missing an evicted link is as good as unknown
+                word, offset = link
+                words.append(word)
+            return words
+
+        def remember_solution(found_words: list[str], stack: list, offset: int) -> list[str]:
+            """ link the suffix at every frame on the way to `offset` to the word taken from it, for later searches """
+            if cache is not None:
+                next_offsets = [frame_offset for frame_offset, candidates in stack[1:]] + [offset]
+                for (frame_offset, candidates), word, next_offset in zip(stack, found_words, next_offsets):
+                    cache.put(suffix_key(frame_offset), [word, next_offset])
             return found_words
 
-        # iterate over the sorted CMU dict to find a word that matches the remaining phonemes
-        for word, phonemes in cmu_dict_list:
-            if match_function(phonemes, remaining_phonemes):  # if the phonemes don't match, skip
-                # A word was found for the remaining phonemes, recurse!
-                solution = find_next_word(found_words + [word], remaining_phonemes[len(phonemes):])
-                if solution:  # if a solution was found, return it
-                    return solution
-                else:  # if no solution found (no words fit remaining phonemes), continue searching
+        def depth_first() -> list[str] or None:
+            """
+            depth-first search for words that match the phonemes from each offset onwards, longest words first. The stack
+            holds one (offset, matching words still to try) frame per word of the current attempt, and `found_words` grows
+            and shrinks with it, so nothing is copied along the way and phrases of any length fit in memory.
+            """
+            end = len(all_phonemes)
+            found_words = []  # the words leading to the current offset, one per frame below it
+            stack = []
+            offset = start
+            while True:
+                # `found_words` have reached a new offset
+                stats.nodes += 1
+                if tracer.debug:
+                    tracer.emit('node', found_words=list(found_words), remaining_phonemes=all_phonemes[offset:])
+                if offset == end:  # if there are no remaining phonemes, then we have found a valid solution!
+                    return remember_solution(list(found_words), stack, offset)
+                if offset > best_partial[0] and offset in word_boundaries:
+                    best_partial[:] = offset, list(found_words)
+                if budget:
+                    budget.check(stats.nodes, len(found_words), deadline)
+                if cache is not None and offset not in unsolvable_offsets:
+                    solved = cached_suffix(offset)
+                    if solved:
+                        if tracer.debug:
+                            tracer.emit('cached', found_words=found_words + solved)
+                        return remember_solution(found_words + solved, stack, offset)
+                    if solved is False:
+                        unsolvable_offsets.add(offset)
+                if offset in unsolvable_offsets:  # this suffix already failed after a different set of earlier words
+                    stats.cache_hits += 1
+                    if tracer.debug:
+                        tracer.emit('dead_end', found_words=list(found_words), remaining_phonemes=all_phonemes[offset:])
+                else:
+                    # iterate over the words of the sorted CMU dict that match the remaining phonemes
+                    stack.append((offset, matching_words(offset)))
+
+                # take the next word to try, from the deepest frame that still has one
+                while stack:
+                    offset, candidates = stack[-1]
+                    if len(found_words) == len(stack):  # the last word tried from this frame led nowhere
+                        found_words.pop()
+                        stats.backtracks += 1
+                    candidate = next(candidates, None)
+                    while candidate is not None and not candidate[1]:  # a word with no phonemes (e.g. '&' to the g2p model) goes nowhere
+                        candidate = next(candidates, None)
+                    if candidate is not None:
+                        word, phonemes = candidate[0], candidate[1]
+                        found_words.append(word)
+                        offset += len(phonemes)
+                        break
+                    # No word was found for remaining phonemes
+                    if tracer.debug:
+                        tracer.emit('failed', found_words=list(found_words), remaining_phonemes=all_phonemes[offset:])
+                    unsolvable_offsets.add(offset)
+                    if cache is not None:
+                        cache.put(suffix_key(offset), False)
+                    stack.pop()
+                else:
+                    return None
+
+        def best_first() -> list[str] or None:
+            """
+            A* over phoneme offsets: the cheapest segmentation under `self.cost_model`. The cost of the rest of a phrase
+            only depends on where it starts, so each offset is expanded at most once, cheapest (estimated) first.
+            """
+            cost_model = self.cost_model
+            end = len(all_phonemes)
+            longest = max([self.longest] + [len(phonemes) for word, phonemes in phoneme_chunks])
+            nonlocal total_cost
+            costs = {0: 0.0}  # offset -> cheapest cost found to reach it
+            came_from = {0: None}  # offset -> (previous offset, word) on the cheapest way there
+            depths = {0: 0}  # offset -> words on the cheapest way there
+            expanded = set()
+            frontier = [(cost_model.heuristic(end, longest), 0)]  # (estimated total cost, -offset): ties go to the furthest offset
+
+            def path(offset: int) -> list[str]:
+                found_words = []
+                while came_from[offset] is not None:
+                    offset, word = came_from[offset]
+                    found_words.append(word)
+                return found_words[::-1]
+
+            while frontier:
+                estimate, offset = heappop(frontier)
+                offset = -offset
+                if offset in expanded:  # already reached more cheaply
                     continue
-        else:
-            # No word was found for remaining phonemes
-            print(f'{C.RED}- Failed: {found_words} + {remaining_phonemes}{C.END}')
+                expanded.add(offset)
+                stats.nodes += 1
+                if tracer.debug:
+                    tracer.emit('node', found_words=path(offset), remaining_phonemes=all_phonemes[offset:])
+                if offset == end:
+                    total_cost = costs[offset]
+                    return path(offset)
+                if offset > best_partial[0] and offset in word_boundaries:
+                    best_partial[:] = offset, path(offset)
+                if budget:
+                    budget.check(stats.nodes, depths[offset], deadline)
+
+                for word, phonemes, slips, original in matching_words(offset):
+                    next_offset = offset + len(phonemes)
+                    if not phonemes or next_offset > end or next_offset in expanded:
+                        continue
+                    cost = costs[offset] + cost_model.word(slips, original)
+                    if cost < costs.get(next_offset, float('inf')):
+                        costs[next_offset] = cost
+                        came_from[next_offset] = offset, word
+                        depths[next_offset] = depths[offset] + 1
+                        heappush(frontier, (cost + cost_model.heuristic(end - next_offset, longest), -next_offset))
             return None
 
-    # this should never return None, as there should always be at least one solution (the original phrase itself)
-    found_words = find_next_word([], all_phonemes)
-    assert found_words
+        # this should never return None, as there should always be at least one solution (the original phrase itself)
+        degraded = False
+        total_cost = None
+        with Stopwatch(stats, 'search_seconds'):
+            try:
+                found_words = best_first() if strategy == 'best' else depth_first()
+            except BudgetExceeded as e:
+                if start:
+                    raise
+                boundary, found_words = best_partial
+                if tracer.info:
+                    tracer.emit('budget', reason=str(e), kept=len(found_words))
+                found_words = found_words + [word for word, phonemes in phoneme_chunks[word_boundaries[boundary]:]]
+                degraded = True
+        if start:
+            return None if found_words is None else Confabulation(found_words, stats)
+        assert found_words
+
+        if tracer.info:
+            tracer.emit('stats', stats=stats)
+        confabulation = Confabulation(found_words, stats, degraded, total_cost)
+        self.cache_result(phrase, match_function, strategy, confabulation)
+        return confabulation
+
+    def search_speculative(self, phrase: str, match_function=None, workers: int = None, levels: int = 1, budget: Budget = None) -> Confabulation:
+        """
+        `search` with the 'first' strategy on a forked pool: the branches for the first `levels` words are searched at
+        once, and the earliest one (in the order a plain search would try them) that leads to a confabulation wins, with
+        the rest cancelled as soon as they can't win anymore. Same result as `search`, in as little as one branch's time.
+        If a branch ahead of the winner runs out of budget, the phrase is kept as it is.
+        """
+        match_function = match_function or self.match_function
+        budget = budget or self.budget
+        cached = self.cached(phrase, match_function, 'first')
+        if cached is not None:
+            return cached
+        stats = SearchStats()
+        phoneme_chunks, all_phonemes, matching_words = self.matcher(phrase, match_function, stats)
+        branches = speculative_branches(matching_words, len(all_phonemes), levels)
+        offsets = list(dict.fromkeys(offset for words, offset in branches))  # branches that reach the same offset share the rest
+        if len(offsets) < 2 or workers == 1:
+            return self.search(phrase, match_function, budget, 'first')
+
+        depths = [min(len(words) for words, offset in branches if offset == branch_offset) for branch_offset in offsets]
+        found = search_branches(self, phrase, match_function, offsets, depths, budget, workers)
+        if found is None:
+            if self.tracer.info:
+                self.tracer.emit('budget', reason='a branch ran out', kept=0)
+            return Confabulation([word for word, phonemes in phoneme_chunks], stats, degraded=True)
+        rank, rest = found
+        stats.add(rest.stats)  # the winning branch's; the others' counters stay in their workers
+        words = next(words for words, offset in branches if offset == offsets[rank])
+        confabulation = Confabulation(words + rest.words, stats)
+        if self.tracer.info:
+            self.tracer.emit('stats', stats=stats)
+        self.cache_result(phrase, match_function, 'first', confabulation)
+        return confabulation
+
+    def lattice(self, phrase: str, match_function=None, stats: SearchStats = None) -> WordLattice:
+        """ every word that fits every reachable offset of the phrase, priced by the cost model """
+        stats = stats or SearchStats()
+        phoneme_chunks, all_phonemes, matching_words = self.matcher(phrase, match_function or self.match_function, stats)
+        with Stopwatch(stats, 'search_seconds'):
+            return WordLattice.build(len(all_phonemes), matching_words, self.cost_model)
+
+    def alternatives(self, phrase: str, match_function=None, n: int = None):
+        """ lazily yield up to `n` (or all) different confabulations of the phrase, cheapest first, all read from one lattice """
+        stats = SearchStats()
+        lattice = self.lattice(phrase, match_function, stats)
+        for cost, words in islice(lattice.segmentations(), n):
+            yield Confabulation(words, stats, cost=cost)
+
+    def search_document(self, text: str, match_function=None, workers: int = None, overlap: int = 0) -> Confabulation:
+        """
+        confabulate a long text clause by clause: the clauses are searched in parallel and stitched back together in order
+        with their punctuation, so the work grows with the length of the text instead of blowing up with it
+        """
+        clauses = split_clauses(text)
+        pieces = document_pieces([self.split_words(clause) for clause, punctuation in clauses], [punctuation for clause, punctuation in clauses], overlap)
+        results = search_pieces(self, [' '.join(words) for words, punctuation in pieces], match_function or self.match_function, workers)
 
-    # use regex to filter out 'alternate word' notation, i.e. "reap what you sow(1)"re.sub(r'\(\d+\)', '', word)
-    return remove_word_version(' '.join(found_words).lower())
+        words, stats = [], SearchStats()
+        for (piece_words, punctuation), result in zip(pieces, results):
+            words.extend(result.words)
+            if punctuation:
+                words[-1] += punctuation
+            stats.add(result.stats)
+        return Confabulation(words, stats, any(result.degraded for result in results))
+
+def confabulate(phrase: str, word_to_phoneme: dict or Lexicon, match_function) -> str:
+    """ one-off `Confabulator.confabulate`; prepares the lexicon on every call, so keep a `Confabulator` around instead for repeated use """
+    return Confabulator(word_to_phoneme, match_function).confabulate(phrase)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='confabulate phrases into different words with the same phonemes')
+    parser.add_argument('--speculate', type=int, default=0, metavar='LEVELS', help='search the branches for the first LEVELS words in parallel (default: off)')
+    parser.add_argument('-w', '--workers', dest='speculate_workers', metavar='N', type=int, default=None, help='worker processes for --speculate (default: one per CPU)')
+    subparsers = parser.add_subparsers(dest='command')
+    engine_options = argparse.ArgumentParser(add_help=False)
+    engine_options.add_argument('-m', '--mode', choices=list(MATCH_FUNCTIONS), default='strict', help='match type')
+    engine_options.add_argument('-s', '--strategy', choices=STRATEGIES, default='first', help='take the first confabulation found, or search for the best one')
+    engine_options.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    engine_options.add_argument('--max-nodes', type=int, default=None, help='give up on a phrase after searching this many nodes')
+    engine_options.add_argument('--max-seconds', type=float, default=None, help='give up on a phrase after this many seconds')
+    engine_options.add_argument('--max-depth', type=int, default=None, help='give up on a phrase after this many words deep')
+    engine_options.add_argument('--cache', metavar='PATH', default=None, help='keep finished searches in this SQLite file too, shared by every worker and run (default: in memory only)')
+
+    batch_parser = subparsers.add_parser('batch', parents=[engine_options], help='confabulate a stream of phrases, writing JSONL results in input order')
+    batch_parser.add_argument('input', nargs='?', type=argparse.FileType('r'), default=sys.stdin, help='phrases to confabulate (default: stdin)')
+    batch_parser.add_argument('-o', '--output', type=argparse.FileType('w'), default=sys.stdout, help='where to write the results (default: stdout)')
+    batch_parser.add_argument('-f', '--format', choices=['text', 'jsonl'], default='text', help='one phrase per line, or one {"phrase": ..., "mode": ...} object per line')
+
+    document_parser = subparsers.add_parser('document', parents=[engine_options], help='confabulate a long text clause by clause, in parallel')
+    document_parser.add_argument('input', nargs='?', type=argparse.FileType('r'), default=sys.stdin, help='text to confabulate (default: stdin)')
+    document_parser.add_argument('-o', '--output', type=argparse.FileType('w'), default=sys.stdout, help='where to write the result (default: stdout)')
+    document_parser.add_argument('--overlap', type=int, default=0, help='words either side of each clause break to search together, so words can cross it')
+
+    serve_parser = subparsers.add_parser('serve', parents=[engine_options], help='serve confabulations over HTTP from a warm engine')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    serve_parser.add_argument('--port', type=int, default=8080, help='port to listen on (default: 8080)')
+    serve_parser.add_argument('--max-concurrency', type=int, default=None, help='confabulations in flight before turning requests away (default: twice the workers)')
+
+    bench_parser = subparsers.add_parser('bench', help='time cold start and every match mode over the fixed corpus in bench/, against a stored baseline')
+    bench_parser.add_argument('-m', '--mode', choices=list(MATCH_FUNCTIONS), action='append', help='match type to benchmark, repeatable (default: all of them)')
+    bench_parser.add_argument('-s', '--strategy', choices=STRATEGIES, default='first', help='take the first confabulation found, or search for the best one')
+    bench_parser.add_argument('-r', '--repeat', type=int, default=3, help='times to search each phrase for the latencies (default: 3)')
+    bench_parser.add_argument('--no-memory', action='store_true', help='skip the (slow) peak memory pass')
+    bench_parser.add_argument('--tolerance', type=float, default=1.25, help='how many times worse than the baseline a metric may get (default: 1.25)')
+    bench_parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline to compare future runs against')
+    args = parser.parse_args()
+    if args.command and (args.speculate or args.speculate_workers is not None):
+        parser.error(f'--speculate and -w before a subcommand only apply to the interactive prompt (use `{args.command} -w N` instead)')
+
+    if args.command == 'bench':
+        regressions = bench(Confabulator, MATCH_FUNCTIONS, args.mode, args.repeat, args.strategy, not args.no_memory,
+                            save_baseline=args.save_baseline, tolerance=args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+    if args.command in ('batch', 'document', 'serve'):
+        # keep stdout for the results
+        with redirect_stdout(sys.stderr):
+            budget = Budget(args.max_nodes, args.max_seconds, args.max_depth)
+            engine = Confabulator(get_lexicon(), MATCH_FUNCTIONS[args.mode], Tracer(SILENT), budget, args.strategy, cache=SegmentationCache(path=args.cache))
+            if args.command == 'batch':
+                written = run_batch(engine, read_records(args.input, args.format), args.output, MATCH_FUNCTIONS, args.mode, args.workers)
+                print(f'{C.CYAN}@@ Confabulated {written} phrases @@{C.END}')
+            elif args.command == 'document':
+                confabulation = engine.search_document(args.input.read(), workers=args.workers, overlap=args.overlap)
+                args.output.write(confabulation.text + '\n')
+                print(f'{C.CYAN}@@ {confabulation.stats} @@{C.END}')
+            else:
+                try:
+                    asyncio.run(ConfabulationServer(engine, MATCH_FUNCTIONS, args.workers, args.max_concurrency).serve(args.host, args.port))
+                except KeyboardInterrupt:
+                    pass
+        sys.exit()
 
     # select a match type
     match_type = input('Enter a match type (smart, fuzzy, strict): ') or 'strict'
-    match_func = {'smart': smart_phonetic_match, 'fuzzy': fuzzy_phonetic_match, 'strict': strict_phonetic_match}[match_type]
+    match_func = MATCH_FUNCTIONS[match_type]
 
     # get the phrase to confabulate
     phrase = input('Enter a phrase (or leave empty for a default): ') or "the internal revenue service is the greatest agency of all"
-    phrase = phrase.replace(',','').replace('.','').lower()
+    phrase = clean_phrase(phrase)
 
     # run the confabulator
     print(f'{C.CYAN}@@ Running `{match_type}` on "{phrase}" @@{C.END}')
-    word_to_phoneme, phoneme_to_word = get_cmudict()
-    confabulated = confabulate(phrase, word_to_phoneme, match_func)
-    print(f'{C.CYAN}@@ Confabulated: {confabulated} @@{C.END}')
\ No newline at end of file
+    lexicon = get_lexicon()  # compiled from the CMU Dictionary on the first run
+    engine = Confabulator(lexicon, match_func)
+    if args.speculate:
+        confabulated = engine.search_speculative(phrase, workers=args.speculate_workers, levels=args.speculate).text
+    else:
+        confabulated = engine.confabulate(phrase)
+    print(f'{C.CYAN}@@ Confabulated: {confabulated} @@{C.END}')
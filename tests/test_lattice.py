@@ -0,0 +1,21 @@
+import time
+from util.cost import CostModel
+from util.lattice import WordLattice
+
+
+def test_segmentations_finish_ties_depth_first():
+    """ a phrase with 2 ** 24 equally cheap segmentations still yields its first few right away, in matching order """
+    length = 24
+
+    def matching_words(offset: int):
+        yield 'a', ['AH'], 0, False
+        yield 'b', ['B'], 0, False  # just as cheap, so every choice of 'a' or 'b' ties
+
+    lattice = WordLattice.build(length, matching_words, CostModel())
+    start = time.perf_counter()
+    segmentations = lattice.segmentations()
+    results = [next(segmentations) for i in range(5)]
+    assert time.perf_counter() - start < 1.0
+    assert all(cost == length * CostModel().word_cost for cost, words in results)
+    assert results[0][1] == ['a'] * length
+    assert len({tuple(words) for cost, words in results}) == 5
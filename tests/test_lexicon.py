@@ -0,0 +1,28 @@
+import os
+import pytest
+from util.lexicon import Lexicon
+
+
+WORDS = {'read': [['R', 'IY1', 'D'], ['R', 'EH1', 'D']], 'reed': [['R', 'IY1', 'D']], 'tomato': [['T', 'AH0', 'M', 'EY1', 'T', 'OW2']]}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    """ a saved lexicon maps back in with the same entries, and no temporary file is left behind """
+    lexicon = Lexicon.from_cmudict(WORDS)
+    path = tmp_path / 'test.lexicon'
+    lexicon.save(str(path))
+    loaded = Lexicon.load(str(path))
+    assert loaded.version == lexicon.version and list(loaded) == list(lexicon)
+    assert loaded.word_id('reed') == lexicon.word_id('reed') is not None and loaded.word_id('red') is None
+    assert os.listdir(tmp_path) == ['test.lexicon']
+
+
+@pytest.mark.parametrize('keep', [0.2, 0.5, 0.99])
+def test_load_rejects_a_cut_off_file(tmp_path, keep: float):
+    """ a file cut off part way through (e.g. by a crash while building it) is refused, so `get_lexicon` rebuilds it """
+    path = tmp_path / 'test.lexicon'
+    Lexicon.from_cmudict(WORDS).save(str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:int(len(data) * keep)])
+    with pytest.raises(ValueError):
+        Lexicon.load(str(path))
@@ -0,0 +1,82 @@
+import random
+import numpy as np
+import pytest
+from confabulator import fuzzy_phonetic_match, smart_phonetic_match
+from util.ipa import encode_arpabet, count_slips
+from util.lexicon import Lexicon
+from util.ngram import BigramIndex, FeatureIndex
+from util.trie import phoneme_similarity
+
+
+# a handful of symbols, so random words share plenty of bigrams and feature classes
+SYMBOLS = ['P', 'B', 'T', 'D', 'K', 'S', 'Z', 'M', 'N', 'L', 'R', 'IY', 'IH', 'AH', 'AA', 'UW', 'ER', 'EY']
+
+
+def random_words(rng: random.Random, count: int = 200) -> list[list[str]]:
+    """ random pronunciations, longest first like the lexicon, with near copies of each other so matches are common """
+    words = []
+    for i in range(count):
+        if words and rng.random() < 0.5:
+            word = list(rng.choice(words))
+            for edit in range(rng.randint(1, 2)):
+                position = rng.randrange(len(word) + 1)
+                if rng.random() < 0.4 or len(word) < 2:
+                    word.insert(position, rng.choice(SYMBOLS))
+                elif rng.random() < 0.5:
+                    del word[min(position, len(word) - 1)]
+                else:
+                    word[min(position, len(word) - 1)] = rng.choice(SYMBOLS)
+        else:
+            word = [rng.choice(SYMBOLS) for j in range(rng.randint(1, 9))]
+        words.append(word)
+    return sorted(words, key=len, reverse=True)
+
+
+def random_phrases(rng: random.Random, words: list[list[str]], count: int = 20) -> list[list[str]]:
+    """ phrases made of the words, some slightly misspoken, so every offset has matches to find """
+    phrases = []
+    for i in range(count):
+        phrase = [phoneme for j in range(rng.randint(1, 6)) for phoneme in rng.choice(words)]
+        for edit in range(rng.randint(0, 3)):
+            phrase[rng.randrange(len(phrase))] = rng.choice(SYMBOLS)
+        phrases.append(phrase)
+    return phrases
+
+
+def lexicon_of(words: list[list[str]]) -> Lexicon:
+    """ a lexicon with one (made up) word per pronunciation, its entries in the same order """
+    return Lexicon.from_cmudict({f'word{i}': phonemes for i, phonemes in enumerate(words)})
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('creativity', [0.1, 0.2, 0.35])
+def test_bigram_index_keeps_every_fuzzy_match(seed: int, creativity: float):
+    """ the bigram count filter never drops an entry that `fuzzy_phonetic_match` accepts """
+    rng = random.Random(seed)
+    words = random_words(rng)
+    index = BigramIndex(lexicon_of(words), creativity)
+    for phrase in random_phrases(rng, words):
+        for start in range(len(phrase)):
+            expected = [(i, phoneme_similarity(word, phrase[start:start + len(word)])) for i, word in enumerate(words)
+                        if fuzzy_phonetic_match(word, phrase[start:], creativity)]
+            assert index.fuzzy_matches(phrase, start) == expected
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('errors', [1, 2])
+def test_feature_index_keeps_every_smart_match(seed: int, errors: int):
+    """ the feature class filter never drops an entry that `smart_phonetic_match` accepts, and prices it the same """
+    rng = random.Random(seed)
+    words = random_words(rng)
+    index = FeatureIndex(lexicon_of(words))
+    for phrase in random_phrases(rng, words):
+        phrase_codes = np.array(encode_arpabet(phrase), dtype=np.int32)
+        code_offsets = [0]
+        for phoneme in phrase:
+            code_offsets.append(code_offsets[-1] + len(encode_arpabet([phoneme])))
+        for offset in range(len(phrase)):
+            expected = [i for i, word in enumerate(words) if smart_phonetic_match(word, phrase[offset:], errors)]
+            indices, costs = index.smart_scores(phrase_codes, code_offsets, offset, errors)
+            assert indices.tolist() == expected
+            start = code_offsets[offset]
+            assert costs.tolist() == [count_slips(encode_arpabet(words[i]), phrase_codes, start, code_offsets[offset + len(words[i])], 2 * errors) for i in expected]
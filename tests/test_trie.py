@@ -0,0 +1,16 @@
+import random
+import pytest
+from confabulator import strict_phonetic_match
+from util.trie import PhonemeTrie
+from tests.test_ngram import random_words, random_phrases, lexicon_of
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_prefix_matches_finds_every_strict_match(seed: int):
+    """ walking the flattened trie finds exactly the entries that `strict_phonetic_match` accepts, in lexicon order """
+    rng = random.Random(seed)
+    words = random_words(rng)
+    trie = PhonemeTrie(lexicon_of(words))
+    for phrase in random_phrases(rng, words) + [['OY'] + words[0], words[0] + ['OY']]:  # a phoneme no entry has
+        for start in range(len(phrase) + 1):
+            assert trie.prefix_matches(phrase, start) == [i for i, word in enumerate(words) if strict_phonetic_match(word, phrase[start:])]
@@ -45,10 +45,8 @@ class IPAString(MutableSequence):
     TAG = "IPAString"
 
     def __init__(self, ipa_chars=None, unicode_string=None, ignore=False, single_char_parsing=False):
-        self.ipa_chars = []
-        if ipa_chars is not None:
-            self.ipa_chars = ipa_chars
-        elif unicode_string is not None:
+        self._views = {}  # name -> FrozenIPAString, for the canonical representation and the filters
+        if unicode_string is not None and ipa_chars is None:
             if not is_unicode_string(unicode_string):
                 raise ValueError("The given string is not a Unicode string.")
             if (not ignore) and (not is_valid_ipa(unicode_string)):
@@ -58,7 +56,8 @@ class IPAString(MutableSequence):
                 return_invalid=False,
                 single_char_parsing=single_char_parsing
             )
-            self.ipa_chars = [UNICODE_TO_IPA[substring] for substring in substrings]
+            ipa_chars = [UNICODE_TO_IPA[substring] for substring in substrings]
+        self.ipa_chars = ipa_chars
 
     def _check(self, value):
         if not isinstance(value, IPAChar):
@@ -83,21 +82,38 @@ class IPAString(MutableSequence):
     def __add__(self, other):
         if not isinstance(other, IPAString):
             raise TypeError("Cannot concatenate an object that is not an IPAString")
-        return IPAString(ipa_chars=(self.ipa_chars + other.ipa_chars))
+        return IPAString(ipa_chars=(list(self.ipa_chars) + list(other.ipa_chars)))
 
     def __getitem__(self, i):
         return self.ipa_chars[i]
 
     def __delitem__(self, i):
         del self.ipa_chars[i]
+        self._views = {}
 
     def __setitem__(self, i, value):
         self._check(value)
         self.ipa_chars[i] = value
+        self._views = {}
 
     def insert(self, i, value):
         self._check(value)
         self.ipa_chars.insert(i, value)
+        self._views = {}
+
+    def _view(self, name, keep):
+        """
+        Return the (cached) FrozenIPAString of the IPA characters for which ``keep`` is true.
+
+        Views are cached until the string is next changed through its own methods
+        (changing the ``ipa_chars`` list in place bypasses this, so don't).
+
+        :rtype: FrozenIPAString
+        """
+        view = self._views.get(name)
+        if view is None:
+            view = self._views[name] = FrozenIPAString(ipa_chars=[c for c in self.ipa_chars if keep(c)])
+        return view
 
     @property
     def ipa_chars(self):
@@ -121,6 +137,7 @@ class IPAString(MutableSequence):
                 self.__ipa_chars = value
             else:
                 raise TypeError("ipa_chars only accepts a list of IPAChar objects")
+        self._views = {}
 
     def is_equivalent(self, other, ignore=False):
         """
@@ -170,16 +187,20 @@ class IPAString(MutableSequence):
     @property
     def canonical_representation(self):
         """
-        Return a new IPAString, containing the canonical representation of the current string,
+        Return a FrozenIPAString, containing the canonical representation of the current string,
         that is, the one composed by the (prefix) minimum number of IPAChar objects.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(unicode_string=u"".join([c.__unicode__() for c in self.ipa_chars]))
+        view = self._views.get(u"canonical")
+        if view is None:
+            view = self._views[u"canonical"] = FrozenIPAString(unicode_string=u"".join([c.__unicode__() for c in self.ipa_chars]))
+            view._views[u"canonical"] = view  # a canonical representation is its own
+        return view
 
     def filter_chars(self, chars=u""):
         """
-        Return a new IPAString, containing only the IPA characters specified
+        Return a FrozenIPAString, containing only the IPA characters specified
         by the ``chars`` string.
 
         Valid values for ``chars`` are:
@@ -219,50 +240,50 @@ class IPAString(MutableSequence):
     @property
     def consonants(self):
         """
-        Return a new IPAString, containing only the consonants in the current string.
+        Return a FrozenIPAString, containing only the consonants in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if c.is_consonant])
+        return self._view(u"consonants", lambda c: c.is_consonant)
 
     @property
     def vowels(self):
         """
-        Return a new IPAString, containing only the vowels in the current string.
+        Return a FrozenIPAString, containing only the vowels in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if c.is_vowel])
+        return self._view(u"vowels", lambda c: c.is_vowel)
 
     @property
     def letters(self):
         """
-        Return a new IPAString, containing only the consonants and the vowels in the current string.
+        Return a FrozenIPAString, containing only the consonants and the vowels in the current string.
 
         This property is an alias for ``cns_vwl``.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
         return self.cns_vwl
 
     @property
     def cns_vwl(self):
         """
-        Return a new IPAString, containing only:
+        Return a FrozenIPAString, containing only:
 
         1. the consonants, and
         2. the vowels
 
         in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if c.is_letter])
+        return self._view(u"cns_vwl", lambda c: c.is_letter)
 
     @property
     def cns_vwl_pstr(self):
         """
-        Return a new IPAString, containing only:
+        Return a FrozenIPAString, containing only:
 
         1. the consonants,
         2. the vowels, and
@@ -270,14 +291,14 @@ class IPAString(MutableSequence):
 
         in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if (c.is_letter) or (c.is_suprasegmental and c.is_primary_stress)])
+        return self._view(u"cns_vwl_pstr", lambda c: (c.is_letter) or (c.is_suprasegmental and c.is_primary_stress))
 
     @property
     def cns_vwl_str(self):
         """
-        Return a new IPAString, containing only:
+        Return a FrozenIPAString, containing only:
 
         1. the consonants,
         2. the vowels, and
@@ -285,14 +306,14 @@ class IPAString(MutableSequence):
 
         in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if (c.is_letter) or (c.is_suprasegmental and c.is_stress)])
+        return self._view(u"cns_vwl_str", lambda c: (c.is_letter) or (c.is_suprasegmental and c.is_stress))
 
     @property
     def cns_vwl_str_len(self):
         """
-        Return a new IPAString, containing only:
+        Return a FrozenIPAString, containing only:
 
         1. the consonants,
         2. the vowels, and
@@ -301,14 +322,14 @@ class IPAString(MutableSequence):
 
         in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if (c.is_letter) or (c.is_suprasegmental and (c.is_stress or c.is_length))])
+        return self._view(u"cns_vwl_str_len", lambda c: (c.is_letter) or (c.is_suprasegmental and (c.is_stress or c.is_length)))
 
     @property
     def cns_vwl_pstr_long(self):
         """
-        Return a new IPAString, containing only:
+        Return a FrozenIPAString, containing only:
 
         1. the consonants,
         2. the vowels, and
@@ -317,14 +338,14 @@ class IPAString(MutableSequence):
 
         in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if (c.is_letter) or (c.is_suprasegmental and (c.is_primary_stress or c.is_long))])
+        return self._view(u"cns_vwl_pstr_long", lambda c: (c.is_letter) or (c.is_suprasegmental and (c.is_primary_stress or c.is_long)))
 
     @property
     def cns_vwl_str_len_wb(self):
         """
-        Return a new IPAString, containing only:
+        Return a FrozenIPAString, containing only:
 
         1. the consonants,
         2. the vowels, and
@@ -334,14 +355,14 @@ class IPAString(MutableSequence):
 
         in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if (c.is_letter) or (c.is_suprasegmental and (c.is_stress or c.is_length or c.is_word_break))])
+        return self._view(u"cns_vwl_str_len_wb", lambda c: (c.is_letter) or (c.is_suprasegmental and (c.is_stress or c.is_length or c.is_word_break)))
 
     @property
     def cns_vwl_str_len_wb_sb(self):
         """
-        Return a new IPAString, containing only:
+        Return a FrozenIPAString, containing only:
 
         1. the consonants,
         2. the vowels, and
@@ -352,9 +373,59 @@ class IPAString(MutableSequence):
 
         in the current string.
 
-        :rtype: IPAString
+        :rtype: FrozenIPAString
         """
-        return IPAString(ipa_chars=[c for c in self.ipa_chars if (c.is_letter) or (c.is_suprasegmental and (c.is_stress or c.is_length or c.is_word_break or c.is_syllable_break))])
+        return self._view(u"cns_vwl_str_len_wb_sb", lambda c: (c.is_letter) or (c.is_suprasegmental and (c.is_stress or c.is_length or c.is_word_break or c.is_syllable_break)))
 
 
+class FrozenIPAString(IPAString):
+    """
+    An immutable IPA string: it can't be changed once built,
+    so it is hashable and can be used as a dict or cache key.
+    Two frozen strings are equal when they have the same IPAChar objects.
+
+    Every view of an IPAString (canonical representation, filters) is a FrozenIPAString.
+    """
 
+    TAG = "FrozenIPAString"
+
+    def __init__(self, ipa_chars=None, unicode_string=None, ignore=False, single_char_parsing=False):
+        super().__init__(ipa_chars=ipa_chars, unicode_string=unicode_string, ignore=ignore, single_char_parsing=single_char_parsing)
+        self._hash = hash(self.ipa_chars)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, FrozenIPAString) and self.ipa_chars == other.ipa_chars
+
+    def __delitem__(self, i):
+        raise TypeError("A FrozenIPAString cannot be changed")
+
+    def __setitem__(self, i, value):
+        raise TypeError("A FrozenIPAString cannot be changed")
+
+    def insert(self, i, value):
+        raise TypeError("A FrozenIPAString cannot be changed")
+
+    @property
+    def ipa_chars(self):
+        """
+        Return the tuple of IPAChar objects composing the IPA string
+
+        :rtype: tuple of IPAChar
+        """
+        return self._ipa_chars
+    @ipa_chars.setter
+    def ipa_chars(self, value):
+        """
+        Set the IPAChar objects composing the IPA string, once
+
+        :param list value: list of IPAChar objects
+        """
+        if hasattr(self, "_ipa_chars"):
+            raise TypeError("A FrozenIPAString cannot be changed")
+        value = [] if value is None else list(value)
+        if not is_list_of_ipachars(value):
+            raise TypeError("ipa_chars only accepts a list of IPAChar objects")
+        self._ipa_chars = tuple(value)
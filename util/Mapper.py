@@ -9,23 +9,28 @@ from __future__ import absolute_import
 from __future__ import print_function
 from collections.abc import MutableMapping  # https://stackoverflow.com/a/70870087
 
-from ipapy import split_using_dictionary
 from ipapy.compatibility import is_unicode_string
 from ipapy.data import load_data_file
 from ipapy.ipachar import variant_to_canonical_string
-from IPAString import IPAString
+from util.IPAString import IPAString
 
 __author__ = "Alberto Pettarin"
 __copyright__ = "Copyright 2016-2019, Alberto Pettarin (www.albertopettarin.it)"
 __license__ = "MIT"
 __email__ = "alberto@albertopettarin.it"
 
+MATCH = None  # trie key holding the mapped string of a complete key (descriptor strings are never None)
+
 class Mapper(MutableMapping):
     """
     A Mapper contains
     a map from IPA canonical representation
     to arbitrary Unicode strings.
 
+    Keys are compiled into a trie the first time a string is mapped,
+    and recompiled after the map changes, so every IPA character is only looked at
+    once per key it could start, instead of once per candidate key length.
+
     :param dict map_dictionary: a dictionary, mapping IPA descriptors to string
     """
 
@@ -34,6 +39,7 @@ class Mapper(MutableMapping):
     def __init__(self, *args, **kwargs):
         self.max_key_length = 0
         self.ipa_canonical_representation_to_mapped_str = dict()
+        self._trie = None  # compiled on first use
         self.update(dict(*args, **kwargs))
 
     def __getitem__(self, key):
@@ -45,10 +51,12 @@ class Mapper(MutableMapping):
         self._check_value(value)
         self.ipa_canonical_representation_to_mapped_str[key] = value
         self.max_key_length = max(self.max_key_length, len(key))
+        self._trie = None
 
     def __delitem__(self, key):
         key = self._check_key(key)
         del self.ipa_canonical_representation_to_mapped_str[key]
+        self._trie = None
 
     def __iter__(self):
         return iter(self.ipa_canonical_representation_to_mapped_str)
@@ -90,6 +98,53 @@ class Mapper(MutableMapping):
         """
         return list(self.ipa_canonical_representation_to_mapped_str.keys())
 
+    @property
+    def trie(self):
+        """
+        Return the keys compiled into a trie of nested dicts,
+        one level per canonical representation of an IPA character,
+        with the mapped string of a complete key under ``MATCH``.
+
+        :rtype: dict
+        """
+        if self._trie is None:
+            trie = dict()
+            for key, value in self.ipa_canonical_representation_to_mapped_str.items():
+                if isinstance(key, tuple):  # IPA strings are split into tuples, so no other key can match
+                    node = trie
+                    for k in key:
+                        node = node.setdefault(k, dict())
+                    node[MATCH] = value
+            self._trie = trie
+        return self._trie
+
+    def split_ipa_string(self, ipa_string):
+        """
+        Split the given IPAString into the longest keys of the map, left to right,
+        or single IPA characters where no key matches.
+
+        Return a list of pairs ``(key, mapped)``, where ``key`` is a tuple of
+        canonical representations and ``mapped`` is ``None`` for an unmapped character.
+
+        :param IPAString ipa_string: the IPAString to be parsed
+        :rtype: list of (tuple, str)
+        """
+        canonical = [c.canonical_representation for c in ipa_string]
+        trie = self.trie
+        acc = []
+        i = 0
+        while i < len(canonical):
+            node, end, mapped = trie, i + 1, None
+            for j in range(i, len(canonical)):
+                node = node.get(canonical[j])
+                if node is None:
+                    break
+                if MATCH in node:
+                    end, mapped = j + 1, node[MATCH]
+            acc.append((tuple(canonical[i:end]), mapped))
+            i = end
+        return acc
+
     def can_map_ipa_string(self, ipa_string):
         """
         Return ``True`` if the mapper can map all the IPA characters
@@ -98,12 +153,7 @@ class Mapper(MutableMapping):
         :param IPAString ipa_string: the IPAString to be parsed
         :rtype: bool
         """
-        canonical = [(c.canonical_representation, ) for c in ipa_string]
-        split = split_using_dictionary(canonical, self, self.max_key_length, single_char_parsing=False)
-        for sub in split:
-            if not sub in self.ipa_canonical_representation_to_mapped_str:
-                return False
-        return True
+        return all(mapped is not None for sub, mapped in self.split_ipa_string(ipa_string))
 
     def map_ipa_string(self, ipa_string, ignore=False, return_as_list=False, return_can_map=False):
         """
@@ -121,21 +171,49 @@ class Mapper(MutableMapping):
         """
         acc = []
         can_map = True
-        canonical = [(c.canonical_representation, ) for c in ipa_string]
-        split = split_using_dictionary(canonical, self, self.max_key_length, single_char_parsing=False)
-        for sub in split:
-            try:
-                acc.append(self.ipa_canonical_representation_to_mapped_str[sub])
-            except KeyError:
-                if ignore:
-                    can_map = False
-                else:
-                    raise ValueError("The IPA string contains an IPA character that is not mapped: %s" % sub)
+        for sub, mapped in self.split_ipa_string(ipa_string):
+            if mapped is not None:
+                acc.append(mapped)
+            elif ignore:
+                can_map = False
+            else:
+                raise ValueError("The IPA string contains an IPA character that is not mapped: %s" % sub)
         mapped = acc if return_as_list else u"".join(acc)
         if return_can_map:
             return (can_map, mapped)
         return mapped
 
+    def map_many(self, strings, ignore=False, return_as_list=False, return_can_map=False, cache=None):
+        """
+        Map a batch of IPAStrings and/or Unicode strings, in order,
+        like ``map_ipa_string`` and ``map_unicode_string`` do one at a time.
+
+        Each distinct string is only parsed and mapped once:
+        results are kept in ``cache``, which can be passed in again
+        to share it between batches with the same options (as long as the mapper doesn't change in between).
+
+        :param list strings: IPAStrings and/or Unicode strings to be mapped
+        :param bool ignore: if ``True``, ignore Unicode characters that are not IPA valid
+        :param bool return_as_list: if ``True``, return each as a list of strings, one for each IPAChar
+        :param bool return_can_map: if ``True``, return each as a pair ``(bool, str)``, see ``map_ipa_string``
+        :param dict cache: results by string, shared between calls
+        :rtype: list
+        """
+        if cache is None:
+            cache = dict()
+        acc = []
+        for string in strings:
+            key = tuple(string.ipa_chars) if isinstance(string, IPAString) else string
+            if key not in cache:
+                if isinstance(string, IPAString):
+                    cache[key] = self.map_ipa_string(string, ignore=ignore, return_as_list=True, return_can_map=True)
+                else:
+                    cache[key] = self.map_unicode_string(string, ignore=ignore, return_as_list=True, return_can_map=True)
+            can_map, mapped = cache[key]
+            mapped = list(mapped) if return_as_list else u"".join(mapped)
+            acc.append((can_map, mapped) if return_can_map else mapped)
+        return acc
+
     def map_unicode_string(self, unicode_string, ignore=False, single_char_parsing=False, return_as_list=False, return_can_map=False):
         """
         Convert the given Unicode string, representing an IPA string,
@@ -0,0 +1,164 @@
+import json
+import multiprocessing
+import multiprocessing.pool
+import os
+from collections import deque
+from util.common import clean_phrase
+
+
+# set in the parent before the pool is forked, so every worker shares the same warm engine copy-on-write
+_engine = None
+_match_functions = None
+
+
+def read_records(lines, fmt: str = 'text'):
+    """
+    stream {'phrase': ...} records from plain text lines or JSONL, skipping blank lines; a line that isn't JSON becomes
+    a {'line': ..., 'error': ...} record, so one bad line doesn't stop the stream
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if fmt == 'jsonl':
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield {'line': number, 'error': f'{type(e).__name__}: {e}'}
+                continue
+            yield record if isinstance(record, dict) else {'phrase': record}  # a bare JSON string is just a phrase
+        else:
+            yield {'phrase': line}
+
+
+def share_engine(engine, match_functions: dict = None):
+    """ make `engine` the one every worker forked from now on searches with """
+    global _engine, _match_functions
+    _engine, _match_functions = engine, match_functions
+
+
+def fork_pool(engine, match_functions: dict = None, workers: int or None = None) -> multiprocessing.pool.Pool:
+    """ a pool of worker processes forked from this one, sharing `engine` (and everything it has loaded) copy-on-write """
+    share_engine(engine, match_functions)
+    return multiprocessing.get_context('fork').Pool(workers or os.cpu_count())
+
+
+def pronunciation_seeds(engine, phrases: list[str]) -> list[dict[str, tuple[str, ...]]]:
+    """
+    parent side: pronounce the words of every phrase in one g2p batch, so the model is only ever loaded in the parent,
+    and return the {word: phonemes} each phrase's worker needs
+    """
+    phrase_words = [engine.split_words(phrase) if phrase else [] for phrase in phrases]
+    all_words = [word for words in phrase_words for word in words]
+    pronunciations = dict(zip(all_words, engine.pronouncer.pronounce_batch(all_words)))
+    return [{word: pronunciations[word] for word in words} for words in phrase_words]
+
+
+def _record_seeds(engine, phrases: list[str]) -> list[dict[str, tuple[str, ...]] or Exception]:
+    """
+    `pronunciation_seeds` for a window of records; if the g2p model fails on the window, the phrases are tried one at a
+    time so only the ones it fails on get the exception instead of their seeds
+    """
+    try:
+        return pronunciation_seeds(engine, phrases)
+    except Exception:
+        seeds = []
+        for phrase in phrases:
+            try:
+                [phrase_seeds] = pronunciation_seeds(engine, [phrase])
+            except Exception as e:
+                phrase_seeds = e
+            seeds.append(phrase_seeds)
+        return seeds
+
+
+def pooled_search(phrase: str, match_function, pronunciations: dict[str, tuple[str, ...]], budget=None, strategy: str = None, start: int = 0):
+    """ worker side: `Confabulator.search` on the shared engine, with the words already pronounced by the parent """
+    for word, phonemes in pronunciations.items():
+        _engine.pronouncer.remember(word, phonemes)
+    return _engine.search(phrase, match_function, budget, strategy, start)
+
+
+def _record_result(record: dict, confabulation) -> dict:
+    """ the record to write out for a finished confabulation """
+    if confabulation.degraded:  # ran out of budget, so part of the phrase is the original words
+        return {**record, 'confabulated': confabulation.text, 'degraded': True}
+    return {**record, 'confabulated': confabulation.text}
+
+
+def _confabulate_record(record: dict, mode: str, pronunciations: dict[str, tuple[str, ...]]) -> tuple:
+    """
+    worker side: confabulate one record, reporting any failure in the record instead of raising. Returns the record to
+    write out and the confabulation (None on failure), for the parent to cache
+    """
+    try:
+        phrase = clean_phrase(str(record['phrase']))
+        if not phrase:
+            raise ValueError('nothing to confabulate')
+        confabulation = pooled_search(phrase, _match_functions[mode], pronunciations)
+    except Exception as e:
+        return {**record, 'error': f'{type(e).__name__}: {e}'}, None
+    return _record_result(record, confabulation), confabulation
+
+
+def _windows(records, size: int):
+    """ group the records into lists of `size` """
+    window = []
+    for record in records:
+        window.append(record)
+        if len(window) == size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def run_batch(engine, records, output, match_functions: dict, mode: str = 'strict', workers: int or None = None, window: int = 64) -> int:
+    """
+    Confabulate a stream of records on a pool of forked workers, writing one JSON line per record to `output` in input
+    order. Records are read `window` at a time and at most two windows are ever in flight, so memory stays flat no matter
+    how long the input is. Phrases already in the engine's cache are written straight from it; the rest of each
+    window's words are pronounced in the parent in one g2p batch and handed to the workers, so the g2p model is only
+    ever loaded once. Returns the number of records written.
+    """
+    engine.prepare(match_functions[mode])  # build the default mode's indexes once, before they're shared
+
+    written = 0
+    pending = deque()  # records that never reached a worker, or (result, phrase, match function) for those that did, in input order
+
+    def write_oldest():
+        nonlocal written
+        result = pending.popleft()
+        if not isinstance(result, dict):
+            async_result, phrase, match_function = result
+            result, confabulation = async_result.get()
+            if confabulation is not None:  # so a repeat later on is answered from the cache in the parent
+                engine.cache_result(phrase, match_function, None, confabulation)
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output.flush()
+        written += 1
+
+    with fork_pool(engine, match_functions, workers) as pool:
+        for batch in _windows(records, window):
+            phrases = [clean_phrase(str(record.get('phrase', ''))) for record in batch]
+            functions = [match_functions.get(record.get('mode', mode)) for record in batch]
+            hits = [engine.cached(phrase, function) if phrase and function else None for phrase, function in zip(phrases, functions)]
+            seeds = iter(_record_seeds(engine, [phrase for phrase, hit in zip(phrases, hits) if hit is None]))
+            for record, phrase, function, hit in zip(batch, phrases, functions, hits):
+                if 'error' in record and 'phrase' not in record:  # couldn't even be read, so it's written out as it is
+                    pending.append(record)
+                elif hit is not None:  # seen before, so it needs neither its phonemes nor a worker
+                    pending.append(_record_result(record, hit))
+                elif isinstance(record_seeds := next(seeds), Exception):  # couldn't be pronounced, so it never reaches a worker
+                    pending.append({**record, 'error': f'{type(record_seeds).__name__}: {record_seeds}'})
+                else:
+                    pending.append((pool.apply_async(_confabulate_record, (record, record.get('mode', mode), record_seeds)), phrase, function))
+
+            # backpressure: don't read another window until the oldest one has been written out
+            while len(pending) > window:
+                write_oldest()
+
+        while pending:
+            write_oldest()
+
+    return written
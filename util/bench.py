@@ -0,0 +1,147 @@
+import json
+import os
+import platform
+import time
+import tracemalloc
+import numpy as np
+from hashlib import blake2b
+from util.common import get_cmudict, clean_phrase
+from util.common import Color as C
+from util.g2p import get_g2p_model
+from util.lexicon import Lexicon, get_lexicon
+from util.trace import Tracer, SILENT
+
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench')
+CORPUS_PATH = os.path.join(BENCH_DIR, 'corpus.jsonl')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+NOISE_SECONDS = 0.002  # timing differences smaller than this are never reported as regressions
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list[dict]:
+    """ the fixed {'id', 'size', 'phrase'} records to benchmark, from short phrases up to paragraphs """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def timed(function, *args):
+    """ (result, seconds) """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def percentiles(seconds: list[float]) -> dict:
+    return {f'p{q}_ms': round(float(np.percentile(seconds, q)) * 1000, 3) for q in (50, 90, 99)} | {'max_ms': round(max(seconds) * 1000, 3)}
+
+
+def run_bench(engine_class, match_functions: dict, modes: list[str], corpus: list[dict], repeat: int = 3, strategy: str = 'first', memory: bool = True) -> dict:
+    """
+    Benchmark every stage the way a fresh process meets it: compiling and loading the lexicon, preparing the engine and
+    loading the g2p model (cold start), then each mode's index build and its per-phrase latency, nodes and peak memory
+    over the corpus. Each mode gets an engine of its own, and every phrase is searched once untimed and then `repeat`
+    times for the latencies; peak memory is measured on a separate pass, since tracing allocations slows everything down.
+    """
+    results = {'corpus': blake2b(json.dumps(corpus).encode(), digest_size=8).hexdigest(), 'python': platform.python_version(),
+               'strategy': strategy, 'cold_start': {}, 'modes': {}}
+    cold_start = results['cold_start']
+
+    word_to_pronunciations, cold_start['cmudict_seconds'] = timed(get_cmudict)
+    lexicon, cold_start['lexicon_build_seconds'] = timed(Lexicon.from_cmudict, word_to_pronunciations)
+    del word_to_pronunciations, lexicon
+    lexicon, cold_start['lexicon_load_seconds'] = timed(get_lexicon)
+    new_engine = lambda: engine_class(lexicon, tracer=Tracer(SILENT), strategy=strategy)
+    engine, cold_start['engine_seconds'] = timed(new_engine)
+    _, cold_start['g2p_model_seconds'] = timed(get_g2p_model)
+    phrases = [clean_phrase(record['phrase']) for record in corpus]
+    _, cold_start['g2p_corpus_seconds'] = timed(engine.pronounce_phrases, phrases)
+
+    for mode in modes:
+        match_function = match_functions[mode]
+        print(f'{C.CYAN}@@ Benchmarking `{mode}` on {len(corpus)} phrases @@{C.END}')
+        engine = new_engine()  # a fresh engine per mode, so no mode gets another's indexes and caches for free
+        engine.pronounce_phrases(phrases)
+        _, index_seconds = timed(engine.prepare, match_function)
+        for phrase in phrases:  # one untimed pass, to fill the per-word caches before the warm latencies
+            engine.search(phrase, match_function)
+        latencies, by_size, nodes = [], {}, {}
+        for record, phrase in zip(corpus, phrases):
+            for i in range(repeat):
+                confabulation, seconds = timed(engine.search, phrase, match_function)
+                latencies.append(seconds)
+                by_size.setdefault(record['size'], []).append(seconds)
+            nodes[record['id']] = confabulation.stats.nodes
+
+        mode_results = results['modes'][mode] = {'index_seconds': index_seconds, **percentiles(latencies), 'nodes': sum(nodes.values()), 'nodes_by_phrase': nodes}
+        mode_results['by_size'] = {size: percentiles(seconds) for size, seconds in by_size.items()}
+        if memory:
+            tracemalloc.start()
+            for phrase in phrases:
+                engine.search(phrase, match_function)
+            mode_results['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+            tracemalloc.stop()
+    return results
+
+
+def flatten(results: dict, prefix: str = '') -> dict[str, float]:
+    """ every number in the results, keyed by its path, e.g. 'modes.smart.p90_ms' """
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def is_noise(key: str, current: float, baseline: float) -> bool:
+    """ timing differences too small to mean anything """
+    if key.endswith('_ms'):
+        return abs(current - baseline) < NOISE_SECONDS * 1000
+    if key.endswith('_seconds'):
+        return abs(current - baseline) < NOISE_SECONDS
+    return False
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 1.25) -> list[str]:
+    """ print every metric against the baseline, and return the ones that got worse by more than `tolerance` times """
+    if baseline.get('corpus') != results['corpus']:
+        print(f'{C.YELLOW}! The corpus has changed since the baseline was saved, so not every number is comparable{C.END}')
+    current, before = flatten(results), flatten(baseline)
+    regressions = []
+    for key, value in current.items():
+        if key not in before:
+            print(f'  {key}: {value:g} (new)')
+            continue
+        ratio = value / before[key] if before[key] else (1.0 if value == before[key] else float('inf'))
+        worse = ratio > tolerance and not is_noise(key, value, before[key])  # every metric is lower-is-better
+        color = C.RED if worse else C.GREEN if ratio < 1 / tolerance else ''
+        print(f'{color}  {key}: {value:g} vs {before[key]:g} ({ratio:.2f}x){C.END if color else ""}')
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def bench(engine_class, match_functions: dict, modes: list[str] = None, repeat: int = 3, strategy: str = 'first', memory: bool = True,
+          baseline_path: str = BASELINE_PATH, save_baseline: bool = False, tolerance: float = 1.25) -> int:
+    """ run the benchmark, then compare it to the stored baseline (or replace it); returns how many metrics regressed """
+    results = run_bench(engine_class, match_functions, modes or list(match_functions), load_corpus(), repeat, strategy, memory)
+    print(json.dumps(results, indent=2))
+
+    if save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'{C.YELLOW}! Saved the baseline to {baseline_path}{C.END}')
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f'{C.YELLOW}! No baseline at {baseline_path} yet, save one with --save-baseline{C.END}')
+        return 0
+
+    with open(baseline_path) as f:
+        regressions = compare(results, json.load(f), tolerance)
+    if regressions:
+        print(f'{C.RED}- {len(regressions)} metrics regressed: {", ".join(regressions)}{C.END}')
+    else:
+        print(f'{C.GREEN}+ No regressions against the baseline{C.END}')
+    return len(regressions)
@@ -0,0 +1,33 @@
+import time
+
+
+class BudgetExceeded(Exception):
+    """ raised inside a search once its budget has run out """
+
+
+class Budget:
+    """
+    Limits on a single search, so one pathological phrase can't hold a worker for minutes. Any limit left as None is
+    unlimited; a search that runs out returns the best partial confabulation it found instead (see `Confabulation.degraded`).
+    """
+
+    def __init__(self, max_nodes: int or None = None, max_seconds: float or None = None, max_depth: int or None = None):
+        self.max_nodes = max_nodes  # offsets expanded
+        self.max_seconds = max_seconds  # wall-clock time, from the start of the search
+        self.max_depth = max_depth  # words deep, which also bounds the recursion
+
+    def __bool__(self):
+        return self.max_nodes is not None or self.max_seconds is not None or self.max_depth is not None
+
+    def deadline(self) -> float or None:
+        """ the `time.perf_counter()` a search starting now has to finish by """
+        return None if self.max_seconds is None else time.perf_counter() + self.max_seconds
+
+    def check(self, nodes: int, depth: int, deadline: float or None):
+        """ raise `BudgetExceeded` if any limit has been passed """
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            raise BudgetExceeded(f'more than {self.max_nodes} nodes')
+        if self.max_depth is not None and depth > self.max_depth:
+            raise BudgetExceeded(f'deeper than {self.max_depth} words')
+        if deadline is not None and time.perf_counter() > deadline:
+            raise BudgetExceeded(f'longer than {self.max_seconds}s')
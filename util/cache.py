@@ -0,0 +1,97 @@
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from hashlib import blake2b
+
+
+class SegmentationCache:
+    """
+    Finished searches and solved (or unsolvable) suffixes, kept across phrases and requests. Entries live in an in-memory
+    LRU, and optionally in a local SQLite file shared by every process using the same path, e.g. forked workers; that
+    file is trimmed back to `max_bytes`, oldest writes first. Keys are tuples of JSON values, values are JSON values.
+
+    The cache is best-effort: a busy or broken database is skipped rather than failing a search.
+    """
+
+    def __init__(self, size: int = 4096, path: str or None = None, max_bytes: int = 256 << 20):
+        self.size = size
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()  # key digest -> value, least recently used first
+        self._connection = None
+        self._pid = None  # connections can't cross a fork, so each process opens its own
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(key: tuple) -> bytes:
+        return blake2b(json.dumps(key, separators=(',', ':')).encode(), digest_size=16).digest()
+
+    @property
+    def connection(self) -> sqlite3.Connection or None:
+        if self.path is None:
+            return None
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')  # readers don't block the writer, or each other
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS segmentations (key BLOB PRIMARY KEY, value TEXT NOT NULL)')
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key: tuple):
+        """ the cached value, or None """
+        digest = self.digest(key)
+        value = self.memory.get(digest)
+        if value is not None:
+            self.memory.move_to_end(digest)
+        elif self.path is not None:
+            try:
+                row = self.connection.execute('SELECT value FROM segmentations WHERE key = ?', (digest,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(digest, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: tuple, value):
+        """ cache a (non-None) value under a key """
+        digest = self.digest(key)
+        self._remember(digest, value)
+        if self.path is not None:
+            try:
+                self.connection.execute('INSERT OR REPLACE INTO segmentations VALUES (?, ?)', (digest, json.dumps(value)))
+                self._writes += 1
+                if self._writes % 256 == 0:
+                    self.trim()
+            except sqlite3.Error:
+                pass
+
+    def _remember(self, digest: bytes, value):
+        self.memory[digest] = value
+        self.memory.move_to_end(digest)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def trim(self):
+        """ delete the oldest quarter of the database's entries until it fits in `max_bytes` """
+        connection = self.connection
+        while True:
+            (pages,), (free,), (page_size,) = (connection.execute(f'PRAGMA {pragma}').fetchone() for pragma in ('page_count', 'freelist_count', 'page_size'))
+            if (pages - free) * page_size <= self.max_bytes:
+                return
+            (count,) = connection.execute('SELECT COUNT(*) FROM segmentations').fetchone()
+            if not count:
+                return
+            # replacing an entry gives it a new rowid, so rowids run from the oldest write to the newest
+            connection.execute('DELETE FROM segmentations WHERE rowid IN (SELECT rowid FROM segmentations ORDER BY rowid LIMIT ?)', (max(count // 4, 1),))
+
+    def as_dict(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.memory)}
@@ -13,6 +13,11 @@ def normalize_quotes(inp: str) -> str:
     return inp.replace('’', "'").replace('“', '"').replace('”', '"')
 
 
+def clean_phrase(phrase: str) -> str:
+    """ strip the punctuation the confabulator can't pronounce, lowercase, and collapse runs of whitespace """
+    return ' '.join(phrase.replace(',', '').replace('.', '').lower().split())
+
+
 def remove_phoneme_stress(phonemes: list[str]) -> list[str]:
     """ not neccesary for consideration, see http://www.speech.cs.cmu.edu/cgi-bin/cmudict for more information """
     return [re.sub(r'\d+', '', phoneme) for phoneme in phonemes]
@@ -23,17 +28,13 @@ def remove_word_version(word: str) -> str:
     return re.sub(r'\(\d+\)', '', word)
 
 
-def get_cmudict() -> tuple[dict[str, list[str]], dict[str, str]]:
-    """ load in the CMU Dictionary """
+def get_cmudict() -> dict[str, list[list[str]]]:
+    """ load in the CMU Dictionary, with every pronunciation of every word """
     print(f'{Color.YELLOW}! Loading CMU Dictionary...{Color.END}')
 
     # get CMU dict from nltk corpus
     cmudict.ensure_loaded()
-    raw = cmudict.dict()
-
-    # lookup and reverse lookup dictionaries
-    word_to_phoneme = {word: pronunciation[0] for word, pronunciation in raw.items()}  # NOTE: this will overwrite any words with multiple pronunciations
-    phoneme_to_word = {str(b): a for a, b in word_to_phoneme.items()}  # reverse dictionary to get words from pronunciations; NOTE: this will overwrite any words with the same pronunciations
+    word_to_pronunciations = cmudict.dict()  # the reverse lookup lives in the compiled `Lexicon`, see `Lexicon.homophones`
 
     print(f'{Color.YELLOW}! CMU Dictionary loaded!{Color.END}')
-    return word_to_phoneme, phoneme_to_word
+    return word_to_pronunciations
@@ -0,0 +1,27 @@
+from math import ceil
+
+
+class CostModel:
+    """
+    What a confabulation costs, for the best-first search (lower is better): every word costs `word_cost`, every slip
+    away from the phrase's phonemes costs `slip_cost`, and keeping one of the phrase's own words costs `original_word_cost`
+    on top. Subclass and override `word` for other preferences, as long as no word can cost less than `word_cost`.
+    """
+
+    def __init__(self, word_cost: float = 1.0, slip_cost: float = 0.5, original_word_cost: float = 2.0):
+        assert word_cost > 0 and slip_cost >= 0 and original_word_cost >= 0, 'costs must not be negative'
+        self.word_cost = word_cost
+        self.slip_cost = slip_cost  # per slip: half an error in smart mode, one inserted or deleted phoneme in fuzzy mode
+        self.original_word_cost = original_word_cost
+
+    def word(self, slips: int, original: bool) -> float:
+        """ the cost of using one matched word """
+        return self.word_cost + self.slip_cost * slips + (self.original_word_cost if original else 0)
+
+    def heuristic(self, remaining: int, longest: int) -> float:
+        """
+        a lower bound on the cost of covering `remaining` phonemes with words of at most `longest` phonemes: at least that
+        many words, each costing at least `word_cost`. It never overestimates, so the first complete segmentation the
+        search reaches is a cheapest one.
+        """
+        return self.word_cost * ceil(remaining / longest)
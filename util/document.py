@@ -0,0 +1,61 @@
+import re
+from util.common import normalize_quotes, clean_phrase
+from util.batch import fork_pool, pronunciation_seeds, pooled_search
+
+
+CLAUSE_BREAK = re.compile(r'\s*([.!?;:,]+|\n\s*\n)\s*')  # sentence and clause punctuation, or a blank line
+
+
+def split_clauses(text: str) -> list[tuple[str, str]]:
+    """ (clause, punctuation after it) for every sentence and clause of a text, ready to be confabulated on its own """
+    parts = CLAUSE_BREAK.split(normalize_quotes(text))
+    clauses = []
+    for clause, punctuation in zip(parts[::2], parts[1::2] + ['']):
+        clause = clean_phrase(clause)
+        if clause:
+            clauses.append((clause, punctuation.strip()))
+    return clauses
+
+
+def document_pieces(clause_words: list[list[str]], punctuation: list[str], overlap: int = 0) -> list[tuple[list[str], str]]:
+    """
+    the (words, punctuation after them) pieces to search for each clause. With `overlap`, up to that many words either
+    side of each clause break are searched together as a seam of their own, so a confabulated word can cross the break
+    (and the punctuation there is dropped, since it may now be inside a word).
+    """
+    if not overlap:
+        return list(zip(clause_words, punctuation))
+
+    pieces = []
+    for i, words in enumerate(clause_words):
+        head = min(overlap, len(words) // 2) if i > 0 else 0  # words given to the seam before this clause
+        tail = min(overlap, len(words) - head) if i < len(clause_words) - 1 else 0  # words given to the seam after it
+        if head:
+            pieces[-1][0].extend(words[:head])
+        if len(words) > head + tail:
+            pieces.append((words[head:len(words) - tail], '' if tail else punctuation[i]))
+        if tail:
+            pieces.append((words[len(words) - tail:], ''))
+    return [piece for piece in pieces if piece[0]]
+
+
+def search_pieces(engine, phrases: list[str], match_function, workers: int or None = None) -> list:
+    """
+    `Confabulator.search` every phrase, in parallel on a forked pool when there's more than one, in order. Phrases
+    already in the engine's cache are answered from it in the parent, without being pronounced or sent to a worker.
+    """
+    if len(phrases) == 1 or workers == 1:
+        return [engine.search(phrase, match_function) for phrase in phrases]
+    results = [engine.cached(phrase, match_function) for phrase in phrases]
+    misses = [phrase for phrase, result in zip(phrases, results) if result is None]
+    if not misses:
+        return results
+    engine.prepare(match_function)  # build the indexes once, before they're shared
+    seeds = pronunciation_seeds(engine, misses)
+    with fork_pool(engine, workers=workers) as pool:
+        found = iter(pool.starmap(pooled_search, [(phrase, match_function, phrase_seeds) for phrase, phrase_seeds in zip(misses, seeds)]))
+    for i, phrase in enumerate(phrases):
+        if results[i] is None:
+            results[i] = next(found)
+            engine.cache_result(phrase, match_function, None, results[i])
+    return results
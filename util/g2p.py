@@ -0,0 +1,98 @@
+import re
+import numpy as np
+from collections import OrderedDict
+from util.common import remove_phoneme_stress
+
+
+_model = None
+
+
+def get_g2p_model():
+    """ the intelligent g2p using ML (words -> ARPABET phonemes), only loaded the first time it is needed """
+    global _model
+    if _model is None:
+        from g2p_en import G2p  # importing g2p_en alone loads its NLTK taggers
+        _model = G2p()
+    return _model
+
+
+def predict_batch(model, words: list[str]) -> list[list[str]]:
+    """
+    `G2p.predict` for many words at once: words of the same length share one pass through the encoder,
+    then the whole group is decoded greedily step by step, exactly like `G2p.predict` does for a single word.
+    """
+    predictions = {}
+    groups = {}
+    for word in set(words):
+        groups.setdefault(len(word), []).append(word)
+
+    for length, group in groups.items():
+        # encoder
+        encoded = np.concatenate([model.encode(word) for word in group])  # (words, length + 1, embedding)
+        h0 = np.zeros((len(group), model.enc_w_hh.shape[-1]), np.float32)
+        h = model.gru(encoded, length + 1, model.enc_w_ih, model.enc_w_hh, model.enc_b_ih, model.enc_b_hh, h0=h0)[:, -1, :]
+
+        # decoder
+        dec = np.take(model.dec_emb, [2] * len(group), axis=0)  # 2: <s>
+        preds = [[] for word in group]
+        finished = np.zeros(len(group), dtype=bool)
+        for i in range(20):
+            h = model.grucell(dec, h, model.dec_w_ih, model.dec_w_hh, model.dec_b_ih, model.dec_b_hh)
+            pred = (np.matmul(h, model.fc_w.T) + model.fc_b).argmax(axis=-1)
+            finished |= pred == 3  # 3: </s>
+            if finished.all():
+                break
+            for row in np.flatnonzero(~finished):
+                preds[row].append(pred[row])
+            dec = np.take(model.dec_emb, pred, axis=0)
+
+        for word, word_preds in zip(group, preds):
+            predictions[word] = [model.idx2p.get(idx, "<unk>") for idx in word_preds]
+
+    return [predictions[word] for word in words]
+
+
+class Pronouncer:
+    """
+    Word -> stress-free ARPABET phonemes. Words are looked up in the (already loaded) dictionary first, and only
+    out-of-vocabulary words are run through the g2p model; either way the most recent words are cached.
+    """
+
+    PLAIN_WORD = re.compile(r'[a-z]+')  # words g2p_en would send straight to its model, without any preprocessing
+
+    def __init__(self, lookup, cache_size: int = 65536):
+        self.lookup = lookup  # word -> stress-free phonemes, or None if the word isn't in the dictionary
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # word -> phonemes, least recently used first
+
+    def remember(self, word: str, phonemes: tuple[str, ...]) -> tuple[str, ...]:
+        """ cache the phonemes of a word, e.g. ones a parent process already worked out """
+        self.cache[word] = phonemes
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return phonemes
+
+    def pronounce(self, word: str) -> tuple[str, ...]:
+        """ the phonemes of a (lowercase) word """
+        phonemes = self.cache.get(word)
+        if phonemes is not None:
+            self.cache.move_to_end(word)
+            return phonemes
+        phonemes = self.lookup(word)
+        if phonemes is None:
+            phonemes = remove_phoneme_stress(get_g2p_model()(word))
+        return self.remember(word, tuple(phonemes))
+
+    def pronounce_batch(self, words: list[str]) -> list[tuple[str, ...]]:
+        """
+        `pronounce` for many words at once: every distinct out-of-vocabulary word goes through the model in a single
+        batch, and the results are cached for later calls (including forked workers, which inherit the cache).
+        """
+        unknown = {word for word in words if word not in self.cache and self.lookup(word) is None}
+        if unknown:
+            model = get_g2p_model()
+            # anything g2p_en would treat specially (its own dictionary, homographs, punctuation, ...) is left to `pronounce`
+            batch = sorted(word for word in unknown if self.PLAIN_WORD.fullmatch(word) and word not in model.cmu and word not in model.homograph2features)
+            for word, phonemes in zip(batch, predict_batch(model, batch)):
+                self.remember(word, tuple(remove_phoneme_stress(phonemes)))
+        return [self.pronounce(word) for word in words]
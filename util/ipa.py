@@ -1,7 +1,6 @@
 from ipapy.data import UNICODE_TO_IPA
 from ipapy.data import load_data_file
 from util.IPAString import IPAString
-from re import sub
 
 
 def load_data(data_file_path="arpabet.dat"):
@@ -28,23 +27,101 @@ def load_data(data_file_path="arpabet.dat"):
 
 
 arpabet_to_ipa_chars = load_data()
+
+
+class Phoneme:
+    """
+    One IPA character of the ARPABET table, interned: there is exactly one per character (and one empty phoneme, code 0,
+    for symbols missing from the table), so they can be compared with `is` or by their small integer `code`.
+    Its descriptors are also kept as a bitset, so the slip cost between two phonemes is a single XOR and popcount.
+    """
+    __slots__ = ('code', 'ipa_char', 'unicode', 'descriptors', 'bits')
+
+    def __init__(self, code: int, ipa_char, descriptors: frozenset, bits: int):
+        self.code = code
+        self.ipa_char = ipa_char  # the ipapy IPAChar, or None for the empty phoneme
+        self.unicode = str(ipa_char) if ipa_char is not None else ''
+        self.descriptors = descriptors
+        self.bits = bits
+
+    def slips(self, other: 'Phoneme') -> int:
+        """ size of the symmetric difference of the two phonemes' descriptors """
+        return (self.bits ^ other.bits).bit_count()
+
+    def __str__(self):
+        return self.unicode
+
+    def __repr__(self):
+        return f'Phoneme({self.code}, {self.unicode!r})'
+
+
+def build_phonemes(arpabet_to_ipa_chars: dict):
+    """
+    Intern a Phoneme for every distinct IPA character of the ARPABET table, and index them both ways: ARPABET symbol ->
+    phoneme codes, and IPA character -> the first ARPABET symbol containing it. Then precompute the slip cost between
+    every pair of codes.
+    """
+    phonemes = [Phoneme(0, None, frozenset(), 0)]  # code -> phoneme
+    ipa_char_phonemes = {}  # IPAChar -> phoneme (ipapy's IPAChars are singletons, so this is by identity)
+    descriptor_bits = {}  # descriptor -> its bit
+    arpabet_to_ipa_codes = {}  # ARPABET symbol -> tuple of codes
+    ipa_char_to_arpabet = {}  # IPAChar -> ARPABET symbol
+    for arpabet_char, ipa_chars in arpabet_to_ipa_chars.items():
+        codes = []
+        for ipa_char in ipa_chars:
+            if ipa_char not in ipa_char_phonemes:
+                descriptors = frozenset(ipa_char.descriptors)
+                bits = sum(1 << descriptor_bits.setdefault(descriptor, len(descriptor_bits)) for descriptor in descriptors)
+                ipa_char_phonemes[ipa_char] = Phoneme(len(phonemes), ipa_char, descriptors, bits)
+                phonemes.append(ipa_char_phonemes[ipa_char])
+            codes.append(ipa_char_phonemes[ipa_char].code)
+            ipa_char_to_arpabet.setdefault(ipa_char, arpabet_char)
+        arpabet_to_ipa_codes[arpabet_char] = tuple(codes)
+
+    slip_costs = [[a.slips(b) for b in phonemes] for a in phonemes]
+    return phonemes, arpabet_to_ipa_codes, ipa_char_to_arpabet, slip_costs
+
+
+phonemes, arpabet_to_ipa_codes, ipa_char_to_arpabet, slip_costs = build_phonemes(arpabet_to_ipa_chars)
+
+
+def encode_arpabet(arpabet_chars: list[str]) -> tuple[int, ...]:
+    """ convert ARPABET phonemes (with or without stress) to a flat tuple of IPA character codes """
+    return tuple(code for arpabet_char in arpabet_chars for code in arpabet_to_ipa_codes.get(arpabet_char.rstrip('0123456789'), (0,)))
+
+
+def decode_ipa(codes: tuple[int, ...]) -> str:
+    """ the unicode IPA of a tuple of codes, for display """
+    return ''.join(phonemes[code].unicode for code in codes)
+
+
+def count_slips(word_codes: tuple[int, ...], codes: tuple[int, ...], start: int, end: int, limit: float) -> int:
+    """
+    Total slip cost between `word_codes` and codes[start:end], compared character by character over the shorter
+    of the two. Stops early (returning the partial cost) as soon as the cost exceeds `limit`.
+    """
+    cost = 0
+    for i in range(min(len(word_codes), end - start)):
+        cost += slip_costs[word_codes[i]][codes[start + i]]
+        if cost > limit:
+            break
+    return cost
+
+
 def arpabet_to_ipa(arpabet_chars: list[str]):
+    """ the IPAString of ARPABET phonemes (with or without stress); only worth building for display, otherwise use `encode_arpabet` """
     if not arpabet_chars or not all(arpabet_char for arpabet_char in arpabet_chars):
         return IPAString()
-    ipa_chars = [ipa_char for arpabet_char in arpabet_chars for ipa_char in arpabet_to_ipa_chars[sub(r'\d+', '', arpabet_char)]]  # flatten list of tuples AND remove numbers (nuances) from ARPABET characters
-    ipa_string = IPAString(ipa_chars=ipa_chars)
-    return ipa_string
+    return IPAString(ipa_chars=[phonemes[code].ipa_char for arpabet_char in arpabet_chars for code in arpabet_to_ipa_codes[arpabet_char.rstrip('0123456789')]])
 
 
 def ipa_to_arpabet(ipa_string: IPAString):
     arpabet_chars = []
     for ipa_char in ipa_string:
-        for arpabet_char, ipa_chars in arpabet_to_ipa_chars.items():
-            if ipa_char in ipa_chars:
-                arpabet_chars.append(arpabet_char)
-                break
-        else:
+        arpabet_char = ipa_char_to_arpabet.get(ipa_char)
+        if arpabet_char is None:
             raise ValueError(f"IPA character '{ipa_char}' not found in database!")
+        arpabet_chars.append(arpabet_char)
     return arpabet_chars
 
 
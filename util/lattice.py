@@ -0,0 +1,90 @@
+import numpy as np
+from heapq import heappush, heappop
+from itertools import count
+from math import inf
+
+
+class WordLattice:
+    """
+    Every word that fits every reachable offset of a phrase, as flat arrays: the edges leaving phoneme offset `o` are
+    `edge_starts[o]:edge_starts[o + 1]`, each one a word (an index into `vocabulary`) ending at another offset for a cost.
+    Built once per phrase, it can then be read for as many segmentations as wanted, cheapest first.
+    """
+
+    def __init__(self, length: int, edge_starts: np.ndarray, edge_ends: np.ndarray, edge_words: np.ndarray, edge_costs: np.ndarray, vocabulary: list[str]):
+        self.length = length  # phonemes in the phrase
+        self.edge_starts = edge_starts  # offset -> its first edge (one extra at the end)
+        self.edge_ends = edge_ends  # edge -> offset after its word
+        self.edge_words = edge_words  # edge -> its word in `vocabulary`
+        self.edge_costs = edge_costs  # edge -> cost of its word
+        self.vocabulary = vocabulary  # every word in the lattice, once
+        self.cost_to_go = self._cost_to_go()  # offset -> exact cost of the cheapest way from there to the end
+
+    @classmethod
+    def build(cls, length: int, matching_words, cost_model) -> 'WordLattice':
+        """ ask `matching_words(offset)` (see `Confabulator.matcher`) for the words at every offset reachable from the start """
+        reachable = [False] * (length + 1)
+        reachable[0] = True
+        edge_starts, edge_ends, edge_words, edge_costs = [0], [], [], []
+        vocabulary = {}  # word -> its index
+        for offset in range(length + 1):  # words only ever move forwards, so each offset is complete before it's reached
+            if reachable[offset] and offset < length:
+                edges = {}  # (end, word) -> edge, keeping only the cheapest pronunciation of a word over the same span
+                for word, phonemes, slips, original in matching_words(offset):
+                    end = offset + len(phonemes)
+                    if not phonemes or end > length:
+                        continue
+                    cost = cost_model.word(slips, original)
+                    edge = edges.get((end, word))
+                    if edge is None:
+                        edges[end, word] = len(edge_ends)
+                        reachable[end] = True
+                        edge_ends.append(end)
+                        edge_words.append(vocabulary.setdefault(word, len(vocabulary)))
+                        edge_costs.append(cost)
+                    elif cost < edge_costs[edge]:
+                        edge_costs[edge] = cost
+            edge_starts.append(len(edge_ends))
+
+        return cls(length, np.array(edge_starts, dtype=np.int32), np.array(edge_ends, dtype=np.int32),
+                   np.array(edge_words, dtype=np.int32), np.array(edge_costs, dtype=np.float64), list(vocabulary))
+
+    def __len__(self):
+        return len(self.edge_ends)
+
+    def _cost_to_go(self) -> np.ndarray:
+        """ one backward pass: the cheapest cost from each offset to the end, or infinity if the end can't be reached """
+        cost_to_go = np.full(self.length + 1, inf)
+        cost_to_go[self.length] = 0
+        for offset in range(self.length - 1, -1, -1):
+            start, end = self.edge_starts[offset], self.edge_starts[offset + 1]
+            if start < end:
+                cost_to_go[offset] = (self.edge_costs[start:end] + cost_to_go[self.edge_ends[start:end]]).min()
+        return cost_to_go
+
+    def segmentations(self):
+        """
+        lazily yield (cost, words) for every segmentation of the phrase, cheapest first. The cost-to-go is exact, so every
+        path popped at the cheapest total leads to a result, and ties go to the newest path (depth-first, words in the
+        order they were matched): each result is reached in as many pops as it has words, plus a push per word fitting
+        along the way, however many segmentations tie with it. Stopping after k results skips the work for the rest.
+        """
+        cost_to_go, edge_starts, edge_ends, edge_words, edge_costs = (array.tolist() for array in (self.cost_to_go, self.edge_starts, self.edge_ends, self.edge_words, self.edge_costs))
+        if cost_to_go[0] == inf:
+            return
+        tiebreak = count(0, -1)  # newest first among equal totals, so ties are finished before they're widened
+        frontier = [(cost_to_go[0], next(tiebreak), 0.0, 0, None)]  # (total cost, tiebreak, cost so far, offset, path)
+        while frontier:
+            total, _, cost, offset, path = heappop(frontier)
+            if offset == self.length:
+                words = []
+                while path is not None:  # paths are shared (edge, rest of path) links, only unwound for results
+                    edge, path = path
+                    words.append(self.vocabulary[edge_words[edge]])
+                yield cost, words[::-1]
+                continue
+            for edge in reversed(range(edge_starts[offset], edge_starts[offset + 1])):  # the first matched word is pushed last, so popped first
+                end = edge_ends[edge]
+                if cost_to_go[end] != inf:
+                    next_cost = cost + edge_costs[edge]
+                    heappush(frontier, (next_cost + cost_to_go[end], next(tiebreak), next_cost, end, (edge, path)))
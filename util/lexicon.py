@@ -0,0 +1,237 @@
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import numpy as np
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from hashlib import blake2b
+from util.common import get_cmudict
+from util.common import Color as C
+
+
+LEXICON_PATH = os.path.join(os.path.dirname(__file__), 'cmudict.lexicon')
+MAGIC = b'CONFLEX3'
+HEADER = struct.Struct('=8s16s?xxxIIIII')  # magic, version digest, little endian?, entries, words, symbols bytes, words bytes, phonemes
+
+
+class Lexicon:
+    """
+    A read-only CMU Dictionary with every pronunciation of every word. Each entry is one stress-free pronunciation,
+    stored as small integer phoneme ids and sorted to prefer longer pronunciations first. Everything lives in a handful
+    of flat buffers, so the whole lexicon can be written to a single file once and memory-mapped back in by every later
+    process (and shared between forked workers) without any parsing.
+    """
+
+    def __init__(self, version: bytes, symbols: list[str], word_offsets, words, entry_words, phoneme_offsets, phoneme_ids, word_entry_offsets, by_word, by_pronunciation, by_spelling, buffer=None):
+        self.version = version  # digest of the contents, changes whenever the lexicon does
+        self.symbols = symbols  # phoneme id -> ARPABET phoneme
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(symbols)}
+        self.word_offsets = word_offsets  # word id -> start of the word in `words` (one extra offset at the end)
+        self.words = words  # utf-8 words, back to back, each only once
+        self.entry_words = entry_words  # entry -> word id
+        self.phoneme_offsets = phoneme_offsets  # entry -> start of its phonemes in `phoneme_ids` (one extra offset at the end)
+        self.phoneme_ids = phoneme_ids  # phoneme ids, back to back
+        self.word_entry_offsets = word_entry_offsets  # word id -> start of its entries in `by_word` (one extra offset at the end)
+        self.by_word = by_word  # entries grouped by word, each word's pronunciations in CMU Dictionary order
+        self.by_pronunciation = by_pronunciation  # entries sorted by phoneme ids, for the reverse lookup
+        self.by_spelling = by_spelling  # word ids sorted by their utf-8 bytes, for looking words up
+        self._buffer = buffer  # keeps a memory-mapped file open for as long as the lexicon is in use
+
+    @classmethod
+    def from_cmudict(cls, word_to_pronunciations: dict[str, list[list[str]]]) -> 'Lexicon':
+        """ build the lexicon from `get_cmudict()` output (or a dict of single pronunciations), in the order `confabulate` prefers """
+        symbol_ids = {}
+        word_offsets, words = array('I', [0]), bytearray()
+        pronunciations = []  # (word id, phoneme ids), grouped by word
+        word_entry_offsets = array('I', [0])
+        for word_id, (word, word_pronunciations) in enumerate(word_to_pronunciations.items()):
+            words += word.encode()
+            word_offsets.append(len(words))
+            if word_pronunciations and isinstance(word_pronunciations[0], str):
+                word_pronunciations = [word_pronunciations]
+            distinct = []  # pronunciations that only differ in stress are the same once it's stripped
+            for phonemes in word_pronunciations:
+                ids = bytes(symbol_ids.setdefault(phoneme.rstrip('0123456789'), len(symbol_ids)) for phoneme in phonemes)
+                if ids not in distinct:
+                    distinct.append(ids)
+            pronunciations.extend((word_id, ids) for ids in distinct)
+            word_entry_offsets.append(len(pronunciations))
+
+        order = sorted(range(len(pronunciations)), key=lambda i: len(pronunciations[i][1]), reverse=True)  # prefer longer words first
+        entry_words, phoneme_offsets, phoneme_ids = array('I'), array('I', [0]), array('B')
+        by_word = array('I', bytes(4 * len(order)))
+        for entry, i in enumerate(order):
+            word_id, ids = pronunciations[i]
+            entry_words.append(word_id)
+            phoneme_ids.frombytes(ids)
+            phoneme_offsets.append(len(phoneme_ids))
+            by_word[i] = entry
+        by_pronunciation = array('I', sorted(range(len(order)), key=lambda entry: pronunciations[order[entry]][1]))
+        by_spelling = array('I', sorted(range(len(word_offsets) - 1), key=lambda word_id: words[word_offsets[word_id]:word_offsets[word_id + 1]]))
+
+        symbols = list(symbol_ids)
+        sections = [' '.join(symbols).encode(), word_offsets, words, entry_words, phoneme_offsets, phoneme_ids, word_entry_offsets, by_word, by_pronunciation, by_spelling]
+        version = blake2b(b'\n'.join(bytes(section) for section in sections), digest_size=16).digest()
+        return cls(version, symbols, word_offsets, bytes(words), entry_words, phoneme_offsets, phoneme_ids, word_entry_offsets, by_word, by_pronunciation, by_spelling)
+
+    def save(self, path: str):
+        """
+        write the lexicon to a file that `Lexicon.load` can map back in; it's written to a temporary file next to `path`
+        and then renamed over it, so a crash or another process building at the same time never leaves half a lexicon
+        """
+        symbols = ' '.join(self.symbols).encode()
+        sections = [symbols, self.word_offsets, self.words, self.entry_words, self.phoneme_offsets, self.phoneme_ids, self.word_entry_offsets, self.by_word, self.by_pronunciation, self.by_spelling]
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.lexicon-')
+        try:
+            os.fchmod(fd, 0o644)  # as readable as any other file in the checkout, not just to whoever built it
+            with open(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, self.version, sys.byteorder == 'little', len(self), self.word_count, len(symbols), len(self.words), len(self.phoneme_ids)))
+                for section in sections:
+                    section = memoryview(section).cast('B')
+                    f.write(section)
+                    f.write(b'\0' * (-len(section) % 4))  # keep every section aligned for the integer views
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'Lexicon':
+        """ memory-map a lexicon written by `Lexicon.save`; entries are only decoded when they are accessed """
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(buffer) < HEADER.size:
+            buffer.close()
+            raise ValueError(f"'{path}' is too short to be a lexicon file")
+        magic, version, little_endian, entries, words, symbols_size, words_size, phonemes_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC or little_endian != (sys.byteorder == 'little'):
+            buffer.close()
+            raise ValueError(f"'{path}' is not a lexicon file for this machine")
+        sizes = [symbols_size, words_size, phonemes_size] + [4 * (words + 1)] * 2 + [4 * (entries + 1)] + [4 * entries] * 3 + [4 * words]
+        if HEADER.size + sum(size + (-size % 4) for size in sizes) > len(buffer):
+            buffer.close()
+            raise ValueError(f"'{path}' is shorter than its header says, so it was cut off while being written")
+
+        view = memoryview(buffer)
+        position = HEADER.size
+
+        def section(size: int) -> memoryview:
+            nonlocal position
+            start, position = position, position + size + (-size % 4)
+            return view[start:start + size]
+
+        symbols = str(section(symbols_size), 'ascii').split(' ')
+        word_offsets = section(4 * (words + 1)).cast('I')
+        word_bytes = section(words_size)
+        entry_words = section(4 * entries).cast('I')
+        phoneme_offsets = section(4 * (entries + 1)).cast('I')
+        phoneme_ids = section(phonemes_size)
+        word_entry_offsets = section(4 * (words + 1)).cast('I')
+        by_word = section(4 * entries).cast('I')
+        by_pronunciation = section(4 * entries).cast('I')
+        by_spelling = section(4 * words).cast('I')
+        return cls(version, symbols, word_offsets, word_bytes, entry_words, phoneme_offsets, phoneme_ids, word_entry_offsets, by_word, by_pronunciation, by_spelling, buffer=buffer)
+
+    def __len__(self):
+        return len(self.phoneme_offsets) - 1
+
+    @property
+    def word_count(self) -> int:
+        """ the number of distinct words, which can be fewer than the number of entries """
+        return len(self.word_offsets) - 1
+
+    def spelling(self, word_id: int) -> str:
+        return str(self.words[self.word_offsets[word_id]:self.word_offsets[word_id + 1]], 'utf-8')
+
+    def word_id(self, word: str) -> int or None:
+        """ the id of the word spelled exactly like this, if the lexicon has it """
+        spelling = word.encode()
+        key = lambda word_id: bytes(self.words[self.word_offsets[word_id]:self.word_offsets[word_id + 1]])
+        position = bisect_left(self.by_spelling, spelling, key=key)
+        if position < len(self.by_spelling) and key(self.by_spelling[position]) == spelling:
+            return self.by_spelling[position]
+        return None
+
+    def word(self, index: int) -> str:
+        """ the word the entry is a pronunciation of """
+        return self.spelling(self.entry_words[index])
+
+    def phonemes(self, index: int) -> list[str]:
+        """ the stress-stripped ARPABET phonemes of the entry """
+        return [self.symbols[phoneme_id] for phoneme_id in self.phoneme_ids[self.phoneme_offsets[index]:self.phoneme_offsets[index + 1]]]
+
+    def phoneme_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """ (phoneme ids, entry -> start of its phonemes) as NumPy views of the buffers, for building indexes without decoding any entries """
+        return np.frombuffer(self.phoneme_ids, dtype=np.uint8), np.frombuffer(self.phoneme_offsets, dtype=np.uint32).astype(np.int64)
+
+    def pronunciations(self, word_id: int) -> list[int]:
+        """ the entries of a word, in CMU Dictionary order (the usual pronunciation first) """
+        return list(self.by_word[self.word_entry_offsets[word_id]:self.word_entry_offsets[word_id + 1]])
+
+    def homophones(self, phonemes: list[str]) -> list[int]:
+        """ reverse lookup: the entries pronounced exactly like `phonemes`, in preference order """
+        if any(phoneme not in self.symbol_ids for phoneme in phonemes):
+            return []
+        ids = bytes(self.symbol_ids[phoneme] for phoneme in phonemes)
+        key = lambda entry: bytes(self.phoneme_ids[self.phoneme_offsets[entry]:self.phoneme_offsets[entry + 1]])
+        start = bisect_left(self.by_pronunciation, ids, key=key)
+        end = bisect_right(self.by_pronunciation, ids, lo=start, key=key)
+        return sorted(self.by_pronunciation[start:end])
+
+    def __iter__(self):
+        """ (word, phonemes) for every entry, longest pronunciations first """
+        for index in range(len(self)):
+            yield self.word(index), self.phonemes(index)
+
+
+class SubstringIndex:
+    """
+    Finds every word that contains a given substring, for excluding the words of a phrase (and any word they appear in)
+    from its confabulation. The words are searched as the lexicon stores them, back to back in one utf-8 string, so each
+    lookup is a C-level scan (skipping any hit that straddles two words), and the most recent lookups are cached since the
+    same short words ("a", "the", "of", ...) come up in most phrases.
+    """
+
+    def __init__(self, words: bytes, word_offsets, cache_size: int = 4096):
+        self.text = bytes(words)  # `find`able, and only a byte per character
+        self.starts = word_offsets  # word index -> position of the word in `text` (one extra offset at the end)
+        self.containing = lru_cache(maxsize=cache_size)(self._containing)
+
+    def _containing(self, substring: str) -> np.ndarray:
+        """ ascending indices of the words that contain `substring` """
+        needle = substring.encode()
+        indices = []
+        position = self.text.find(needle)
+        while position != -1 and position < len(self.text):  # an empty substring is also found past the last word
+            index = bisect_right(self.starts, position) - 1
+            if position + len(needle) <= self.starts[index + 1]:
+                indices.append(index)
+                position = self.text.find(needle, self.starts[index + 1])  # skip the rest of a word that already matched
+            else:
+                position = self.text.find(needle, position + 1)
+        return np.array(indices, dtype=np.int64)
+
+
+def build_lexicon(path: str = LEXICON_PATH) -> Lexicon:
+    """ one-time build step: compile the CMU Dictionary into a lexicon file """
+    lexicon = Lexicon.from_cmudict(get_cmudict())
+    lexicon.save(path)
+    print(f'{C.YELLOW}! Compiled lexicon of {lexicon.word_count} words ({len(lexicon)} pronunciations) to {path}{C.END}')
+    return lexicon
+
+
+def get_lexicon(path: str = LEXICON_PATH) -> Lexicon:
+    """ load the compiled lexicon, compiling it from the CMU Dictionary first if there isn't a usable one """
+    try:
+        return Lexicon.load(path)
+    except (FileNotFoundError, ValueError, struct.error):
+        return build_lexicon(path)
+
+
+if __name__ == "__main__":
+    # python -m util.lexicon [path]: (re)compile the lexicon file
+    build_lexicon(sys.argv[1] if len(sys.argv) > 1 else LEXICON_PATH)
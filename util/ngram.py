@@ -0,0 +1,134 @@
+import numpy as np
+from math import ceil
+from util.ipa import encode_arpabet, phonemes as ipa_phonemes, slip_costs
+from util.trie import phoneme_similarity
+
+
+def postings(keys: np.ndarray, entries: np.ndarray, key_count: int) -> tuple[np.ndarray, np.ndarray]:
+    """ an inverted index as flat arrays: the entries under key `k` are `entries[starts[k]:starts[k + 1]]`, in order """
+    order = np.argsort(keys, kind='stable')  # entries are already in order, so they stay sorted within each key
+    starts = np.zeros(key_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=key_count), out=starts[1:])
+    return starts, entries[order].astype(np.int32)
+
+
+def count_hits(starts: np.ndarray, entries: np.ndarray, keys, entry_count: int) -> np.ndarray:
+    """ how many times each entry appears under these keys """
+    hits = [entries[starts[key]:starts[key + 1]] for key in keys]
+    return np.bincount(np.concatenate(hits), minlength=entry_count) if hits else np.zeros(entry_count, dtype=np.int64)
+
+
+class BigramIndex:
+    """
+    Inverted index from phoneme bigrams to lexicon entries, for fuzzy matching.
+
+    A fuzzy match needs a long common subsequence with the phonemes it replaces, and every phoneme outside of it breaks
+    at most two of the entry's bigrams (one more where the phrase has extra phonemes between two of its own), so a match
+    keeps a known minimum of its bigrams. Only the entries with that many bigrams in the upcoming phonemes are compared
+    at all; the rest can't match. Entries too short for the bound to rule anything out are always compared.
+    """
+
+    def __init__(self, lexicon, creativity: float = 0.1):
+        self.lexicon = lexicon  # only the entries that survive the filter are ever decoded
+        self.creativity = creativity
+        self.symbol_ids = lexicon.symbol_ids  # phoneme -> id
+        self.symbol_count = len(lexicon.symbols)
+        phoneme_ids, offsets = lexicon.phoneme_arrays()
+        self.lengths = np.diff(offsets)
+        self.longest = int(self.lengths.max(initial=0))
+
+        flat = phoneme_ids.astype(np.int64)
+        entries = np.repeat(np.arange(len(self.lengths)), self.lengths)
+        pairs = np.flatnonzero(entries[1:] == entries[:-1])  # bigrams within one entry
+        self.starts, self.entries = postings(flat[pairs] * self.symbol_count + flat[pairs + 1], entries[pairs], self.symbol_count ** 2)
+        self._needed = {}  # window length -> bigrams each entry needs
+
+    def needed(self, width: int) -> np.ndarray:
+        """
+        the fewest of each entry's bigrams that must appear in a window of `width` phonemes for it to fuzzy match there
+        (its length past the end of the window means it can't match at all)
+        """
+        if width not in self._needed:
+            needed = np.empty(len(self.lengths), dtype=np.int64)
+            for length in np.unique(self.lengths).tolist():
+                compared = min(length, width)  # the window is cut to the entry's length
+                common = ceil((1 - self.creativity) * (length + compared) / 2 - 1e-9)  # the shortest common subsequence that's similar enough
+                deleted, inserted = length - common, compared - common
+                needed[self.lengths == length] = length - 1 - 2 * deleted - inserted if common <= compared else length
+            self._needed[width] = needed
+        return self._needed[width]
+
+    def fuzzy_matches(self, phonemes: list[str], start: int = 0) -> list[tuple[int, float]]:
+        """
+        (index, similarity) of every entry whose `phoneme_similarity` to the phonemes at `start` (cut to the entry's
+        length) is at least 1 - creativity, in ascending (preference) order
+        """
+        window = phonemes[start:start + self.longest]
+        ids = [self.symbol_ids.get(phoneme, -1) for phoneme in window]
+        bigrams = {a * self.symbol_count + b for a, b in zip(ids, ids[1:]) if a >= 0 and b >= 0}
+        hits = count_hits(self.starts, self.entries, bigrams, len(self.lengths))
+        matches = []
+        for index in np.flatnonzero(hits >= self.needed(len(window))).tolist():
+            entry = self.lexicon.phonemes(index)
+            similarity = phoneme_similarity(entry, window[:len(entry)])
+            if similarity >= 1 - self.creativity:
+                matches.append((index, similarity))
+        return matches
+
+
+class FeatureIndex:
+    """
+    Inverted index from (position, feature class) to lexicon entries, for smart matching, where a feature class is
+    every IPA character with the same descriptors.
+
+    Smart matching compares a word's IPA characters position by position, and every character with other descriptors
+    costs at least one slip, so a match can only differ from the phrase in as many positions as it has slips to spare.
+    Counting an entry's positions that agree with the phrase rules out everything else before any costs are added up.
+    """
+
+    def __init__(self, lexicon):
+        self.slip_costs = np.array(slip_costs, dtype=np.int32)
+        classes = {}  # descriptor bitset -> class
+        self.classes = np.array([classes.setdefault(phoneme.bits, len(classes)) for phoneme in ipa_phonemes], dtype=np.int64)  # code -> class
+        self.class_count = len(classes)
+
+        # every phoneme's IPA character codes, padded, to expand the lexicon's phoneme ids without decoding any entries
+        symbol_codes = [encode_arpabet([symbol]) for symbol in lexicon.symbols]
+        code_counts = np.array([len(codes) for codes in symbol_codes], dtype=np.int64)
+        table = np.zeros((len(symbol_codes), int(code_counts.max(initial=1))), dtype=np.uint8)
+        for symbol, codes in enumerate(symbol_codes):
+            table[symbol, :len(codes)] = codes
+        phoneme_ids, offsets = lexicon.phoneme_arrays()
+        flat = table[phoneme_ids][np.arange(table.shape[1]) < code_counts[phoneme_ids, None]].astype(np.int64)  # every entry's codes, back to back
+        code_offsets = np.concatenate([[0], np.cumsum(code_counts[phoneme_ids])])[offsets]  # entry -> start of its codes in `flat`
+
+        self.lengths = np.diff(offsets)
+        self.code_lengths = np.diff(code_offsets)
+        self.width = int(self.code_lengths.max(initial=0))
+        entries = np.repeat(np.arange(len(self.lengths)), self.code_lengths)
+        positions = np.arange(len(flat)) - np.repeat(code_offsets[:-1], self.code_lengths)
+        self.codes = np.zeros((len(self.lengths), self.width), dtype=np.uint8)  # padded, only read up to each entry's length
+        self.codes[entries, positions] = flat
+        self.starts, self.entries = postings(positions * self.class_count + self.classes[flat], entries, self.width * self.class_count)
+
+    def smart_scores(self, phrase_codes: np.ndarray, code_offsets: list[int], offset: int, errors: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Indices (in order) and slip costs of every entry that `smart_phonetic_match`es the phrase at `offset`.
+        `phrase_codes` are the IPA character codes of the whole phrase, `code_offsets` map phoneme offsets into them.
+        """
+        remaining = len(code_offsets) - 1 - offset
+        start = code_offsets[offset]
+        window = phrase_codes[start:start + self.width]
+        hits = count_hits(self.starts, self.entries, [position * self.class_count + self.classes[code] for position, code in enumerate(window.tolist())], len(self.lengths))
+
+        # entries are compared over their own characters or the phrase's characters for as many phonemes, whichever is shorter
+        window_lengths = np.asarray(code_offsets)[offset + np.minimum(self.lengths, remaining)] - start
+        compared = np.minimum(self.code_lengths, window_lengths)
+        candidates = np.flatnonzero((self.lengths <= remaining) & (hits >= compared - 2 * errors))
+
+        compared = compared[candidates]
+        padded = np.zeros(self.width, dtype=np.int32)
+        padded[:len(window)] = window
+        costs = np.where(np.arange(self.width) < compared[:, None], self.slip_costs[self.codes[candidates], padded], 0).sum(axis=1)
+        mask = costs <= 2 * errors  # every differing descriptor is half a slip
+        return candidates[mask].astype(np.int64), costs[mask]
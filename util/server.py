@@ -0,0 +1,171 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from util.batch import share_engine, pronunciation_seeds, pooled_search
+from util.budget import Budget
+from util.common import clean_phrase
+from util.common import Color as C
+
+
+MAX_BODY = 1 << 20  # bytes
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ConfabulationServer:
+    """
+    A small JSON-over-HTTP service around one warm engine: the lexicon, indexes and g2p model are loaded once, searches
+    run on a pool of worker processes forked from it, and the event loop itself only ever parses and routes requests.
+
+        POST /confabulate  {"phrase": ..., "mode": "smart", "strategy": "best", "max_nodes": ..., "max_seconds": ..., "max_depth": ...}
+        GET  /health
+        GET  /metrics
+
+    At most `max_concurrency` searches are in flight at once; any more are turned away with a 503 instead of queueing.
+    """
+
+    def __init__(self, engine, match_functions: dict, workers: int or None = None, max_concurrency: int or None = None):
+        self.engine = engine
+        self.match_functions = match_functions  # mode name -> match function
+        self.workers = workers or os.cpu_count()
+        self.slots = asyncio.Semaphore(max_concurrency or 2 * self.workers)
+        self.engine_thread = ThreadPoolExecutor(max_workers=1)  # for the parent's pronouncer and cache, which block and aren't thread-safe
+        self.searching = None  # forked in `serve`, once the engine is ready
+        self.started = time.time()
+        self.metrics = {'requests': 0, 'confabulations': 0, 'cache_hits': 0, 'degraded': 0, 'errors': 0, 'rejected': 0, 'in_flight': 0,
+                        'nodes': 0, 'search_seconds': 0.0, 'g2p_seconds': 0.0, 'latency_seconds': 0.0, 'max_latency_seconds': 0.0}
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080):
+        """ fork the workers and answer requests until cancelled """
+        for match_function in self.match_functions.values():
+            self.engine.prepare(match_function)  # every mode's indexes, built once and shared by every worker
+        share_engine(self.engine, self.match_functions)
+        self.searching = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+        list(self.searching.map(int, range(self.workers)))  # fork every worker now, before any requests are in flight
+
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f'{C.CYAN}@@ Serving on http://{host}:{port} with {self.workers} workers @@{C.END}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.searching.shutdown(cancel_futures=True)
+            self.engine_thread.shutdown()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ one request per connection """
+        self.metrics['requests'] += 1
+        try:
+            method, path, body = await self.read_request(reader)
+            status, payload = HTTPStatus.OK, await self.route(method, path, body)
+        except HTTPError as e:
+            status, payload = HTTPStatus(e.status), {'error': str(e)}
+        except Exception as e:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'{type(e).__name__}: {e}'}
+        if status >= 400:
+            self.metrics['rejected' if status == HTTPStatus.SERVICE_UNAVAILABLE else 'errors'] += 1
+
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+        """ (method, path, body) of an HTTP/1.x request """
+        try:
+            method, path, version = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, 'malformed request')
+        if length > MAX_BODY:
+            raise HTTPError(413, f'request bodies are limited to {MAX_BODY} bytes')
+        try:
+            return method, path.split('?')[0], await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise HTTPError(400, 'incomplete request body')
+
+    async def route(self, method: str, path: str, body: bytes) -> dict:
+        if path == '/confabulate':
+            if method != 'POST':
+                raise HTTPError(405, 'use POST')
+            try:
+                request = json.loads(body)
+            except ValueError:
+                raise HTTPError(400, 'the body must be JSON')
+            if not isinstance(request, dict):
+                raise HTTPError(400, 'the body must be a JSON object')
+            return await self.confabulate(request)
+        if method != 'GET':
+            raise HTTPError(405, 'use GET')
+        if path == '/health':
+            return {'status': 'ok', 'lexicon': self.engine.lexicon.version.hex(), 'uptime_seconds': round(time.time() - self.started, 3)}
+        if path == '/metrics':
+            return self.metrics
+        raise HTTPError(404, f'no such endpoint {path}')
+
+    def parse_search(self, request: dict) -> tuple:
+        """ (phrase, match function, budget, strategy) from a /confabulate request, with the engine's defaults for the rest """
+        phrase = clean_phrase(str(request.get('phrase', '')))
+        if not phrase:
+            raise HTTPError(400, 'nothing to confabulate')
+        mode = request.get('mode')
+        if mode is not None and mode not in self.match_functions:
+            raise HTTPError(400, f'unknown mode {mode!r}, expected one of {list(self.match_functions)}')
+        strategy = request.get('strategy')
+        if strategy is not None and strategy not in ('first', 'best'):
+            raise HTTPError(400, f"unknown strategy {strategy!r}, expected 'first' or 'best'")
+        default = self.engine.budget
+        try:
+            budget = Budget(
+                int(request['max_nodes']) if 'max_nodes' in request else default.max_nodes,
+                float(request['max_seconds']) if 'max_seconds' in request else default.max_seconds,
+                int(request['max_depth']) if 'max_depth' in request else default.max_depth,
+            )
+        except (TypeError, ValueError):
+            raise HTTPError(400, 'budgets must be numbers')
+        return phrase, self.match_functions[mode] if mode else self.engine.match_function, budget, strategy
+
+    async def confabulate(self, request: dict) -> dict:
+        phrase, match_function, budget, strategy = self.parse_search(request)
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        confabulation = await loop.run_in_executor(self.engine_thread, self.engine.cached, phrase, match_function, strategy)  # repeats are answered here, without a worker
+        if confabulation is None:
+            if self.slots.locked():
+                raise HTTPError(503, 'too many confabulations in flight, try again later')
+            async with self.slots:
+                self.metrics['in_flight'] += 1
+                try:
+                    [seeds] = await loop.run_in_executor(self.engine_thread, pronunciation_seeds, self.engine, [phrase])
+                    self.metrics['g2p_seconds'] += time.perf_counter() - start
+                    confabulation = await loop.run_in_executor(self.searching, pooled_search, phrase, match_function, seeds, budget, strategy)
+                finally:
+                    self.metrics['in_flight'] -= 1
+            await loop.run_in_executor(self.engine_thread, self.engine.cache_result, phrase, match_function, strategy, confabulation)
+        else:
+            self.metrics['cache_hits'] += 1
+        latency = time.perf_counter() - start
+
+        self.metrics['confabulations'] += 1
+        self.metrics['degraded'] += confabulation.degraded
+        self.metrics['nodes'] += confabulation.stats.nodes
+        self.metrics['search_seconds'] += confabulation.stats.search_seconds
+        self.metrics['latency_seconds'] += latency
+        self.metrics['max_latency_seconds'] = max(self.metrics['max_latency_seconds'], latency)
+        return {'confabulated': confabulation.text, 'words': confabulation.words, 'degraded': confabulation.degraded,
+                'cost': confabulation.cost, 'stats': confabulation.stats.as_dict(), 'latency_seconds': latency}
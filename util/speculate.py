@@ -0,0 +1,86 @@
+import multiprocessing
+from util.batch import fork_pool, pronunciation_seeds, pooled_search
+from util.budget import Budget, BudgetExceeded
+
+
+# set in the parent before the pool is forked: the best rank of a branch known to lead to a confabulation
+_decided = None
+
+
+class Cancelled(BudgetExceeded):
+    """ raised inside a branch once a branch ranked before it has won """
+
+
+class BranchBudget(Budget):
+    """
+    One branch's share of a speculative search's budget: the same deadline as the whole search, depth counted from the
+    start of the phrase, and cancelled as soon as an earlier ranked branch finds a confabulation.
+    """
+
+    def __init__(self, budget: Budget, rank: int, depth: int, deadline: float or None):
+        super().__init__(budget.max_nodes, budget.max_seconds, None if budget.max_depth is None else budget.max_depth - depth)
+        self.rank = rank
+        self._deadline = deadline
+
+    def __bool__(self):
+        return True  # always checked, for the cancellation
+
+    def deadline(self) -> float or None:
+        return self._deadline  # perf_counter is system-wide, so the parent's deadline holds in every worker
+
+    def check(self, nodes: int, depth: int, deadline: float or None):
+        if _decided.value < self.rank:
+            raise Cancelled(f'branch {_decided.value} won')
+        super().check(nodes, depth, deadline)
+
+
+def speculative_branches(matching_words, end: int, levels: int = 1) -> list[tuple[list[str], int]]:
+    """ (words, offset after them) for every way a depth-first search can start with `levels` words, in the order it tries them """
+    branches = [([], 0)]
+    for level in range(levels):
+        expanded = []
+        for words, offset in branches:
+            if offset == end:  # already a whole confabulation
+                expanded.append((words, offset))
+                continue
+            for word, phonemes, slips, original in matching_words(offset):
+                if phonemes and offset + len(phonemes) <= end:  # words with no phonemes go nowhere, overshooting ones never finish the phrase
+                    expanded.append((words + [word], offset + len(phonemes)))
+        branches = expanded
+    return branches
+
+
+def _search_branch(phrase: str, match_function, pronunciations: dict, offset: int, budget: BranchBudget):
+    """ worker side: ('solved', the rest of the confabulation), ('unsolvable', None), or (why it gave up, None) """
+    try:
+        confabulation = pooled_search(phrase, match_function, pronunciations, budget, 'first', offset)
+    except BudgetExceeded as e:
+        return str(e), None
+    if confabulation is None:
+        return 'unsolvable', None
+    with _decided.get_lock():  # cancel every branch ranked after this one
+        _decided.value = min(_decided.value, budget.rank)
+    return 'solved', confabulation
+
+
+def search_branches(engine, phrase: str, match_function, offsets: list[int], depths: list[int], budget: Budget, workers: int or None = None) -> tuple or None:
+    """
+    Search the rest of the phrase from every offset (in rank order) on a forked pool, and return (rank, the rest of the
+    confabulation) for the first that can be solved once every offset ranked before it has failed, or None if one of
+    those ran out of budget. Leaving the pool terminates whatever is still running.
+    """
+    global _decided
+    engine.prepare(match_function)  # build the indexes once, before they're shared
+    [seeds] = pronunciation_seeds(engine, [phrase])
+    deadline = budget.deadline()
+    _decided = multiprocessing.get_context('fork').Value('i', len(offsets))
+    with fork_pool(engine, workers=workers) as pool:
+        pending = [pool.apply_async(_search_branch, (phrase, match_function, seeds, offset, BranchBudget(budget, rank, depth, deadline)))
+                   for rank, (offset, depth) in enumerate(zip(offsets, depths))]
+        for rank, result in enumerate(pending):
+            status, confabulation = result.get()
+            if status == 'solved':
+                return rank, confabulation
+            if status != 'unsolvable':  # out of budget, so the branches after it can't be trusted to win
+                return None
+    return None
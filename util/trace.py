@@ -0,0 +1,83 @@
+import time
+from util.common import Color as C
+
+
+# trace levels, each one includes the ones before it
+SILENT = 0
+INFO = 1  # one line per phase of a search
+DEBUG = 2  # every node, match and dead end
+
+# how `print_sink` shows each event
+FORMATS = {
+    'phonemes': (C.CYAN, '@@ Split phonemes: {phonemes} @@'),
+    'lexicon': (C.CYAN, '@@ Running on a sorted CMU Dictionary of {words} words! @@'),
+    'node': (C.GREEN, '+ Finding: {found_words} + {remaining_phonemes}'),
+    'match': (C.GREEN, '+ Matched: {comparison_ipa} -> {word_ipa} | {differences} '),
+    'dead_end': (C.RED, '- Known dead end: {found_words} + {remaining_phonemes}'),
+    'failed': (C.RED, '- Failed: {found_words} + {remaining_phonemes}'),
+    'cached': (C.GREEN, '+ Cached: {found_words}'),
+    'budget': (C.YELLOW, '! Out of budget ({reason}), keeping the first {kept} words found and the original words after them'),
+    'stats': (C.CYAN, '@@ {stats} @@'),
+}
+
+
+def print_sink(event: str, fields: dict):
+    """ the default sink: print each event as a colored line """
+    color, message = FORMATS.get(event, (C.YELLOW, event + ': {fields}'))
+    print(f'{color}{message.format(fields=fields, **fields)}{C.END}')
+
+
+class Tracer:
+    """
+    Structured trace events from the search, sent to a pluggable sink as (event, fields). Callers check `info` or
+    `debug` before building an event, so a silent tracer costs one attribute lookup and nothing is ever formatted.
+    """
+
+    def __init__(self, level: int = DEBUG, sink=print_sink):
+        self.level = level
+        self.sink = sink  # (event, fields) -> None
+        self.info = level >= INFO
+        self.debug = level >= DEBUG
+
+    def emit(self, event: str, **fields):
+        self.sink(event, fields)
+
+
+class SearchStats:
+    """ counters for one search """
+
+    __slots__ = ('nodes', 'match_calls', 'backtracks', 'cache_hits', 'g2p_seconds', 'search_seconds')
+
+    def __init__(self):
+        self.nodes = 0  # offsets the search reached (or expanded, for 'best')
+        self.match_calls = 0  # lookups of the words matching an offset
+        self.backtracks = 0  # candidate words whose suffix couldn't be solved
+        self.cache_hits = 0  # searches answered from memory instead (e.g. known dead ends)
+        self.g2p_seconds = 0.0  # turning the phrase into phonemes
+        self.search_seconds = 0.0  # finding the words
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def add(self, other: 'SearchStats'):
+        """ count another search's work as part of this one """
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def __repr__(self):
+        return ', '.join(f'{name}={value:.3f}' if isinstance(value, float) else f'{name}={value}' for name, value in self.as_dict().items())
+
+
+class Stopwatch:
+    """ adds the time spent inside a `with` block to a `SearchStats` field """
+
+    def __init__(self, stats: SearchStats, field: str):
+        self.stats = stats
+        self.field = field
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        setattr(self.stats, self.field, getattr(self.stats, self.field) + time.perf_counter() - self.start)
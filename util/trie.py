@@ -0,0 +1,59 @@
+import numpy as np
+from bisect import bisect_left, bisect_right
+
+
+def phoneme_similarity(a: list[str], b: list[str]) -> float:
+    """
+    Similarity of two phoneme sequences, in [0, 1]: twice the length of their longest common subsequence over their
+    total length. This is the same formula as difflib's `SequenceMatcher.ratio`, but with an optimal alignment
+    instead of SequenceMatcher's greedy matching blocks, so it is never lower (and nearly always equal on words).
+    """
+    if not a and not b:
+        return 1.0
+    row = [0] * (len(b) + 1)  # longest common subsequence of a[:i] and b[:j]
+    for phoneme in a:
+        previous_diagonal = 0
+        for j in range(1, len(b) + 1):
+            previous_diagonal, row[j] = row[j], previous_diagonal + 1 if b[j - 1] == phoneme else max(row[j], row[j - 1])
+    return 2.0 * row[-1] / (len(a) + len(b))
+
+
+class PhonemeTrie:
+    """
+    Prefix trie over a lexicon's stress-stripped pronunciations, laid out flat on its entries sorted by phonemes
+    (`Lexicon.by_pronunciation`): every trie node is the run of sorted entries that share its path, so stepping down one
+    phoneme narrows the run with two binary searches over a byte column, and the entries ending at a node sort first in
+    its run. Nothing is built but those columns, one byte per entry per phoneme position, and no entry is ever decoded.
+    """
+
+    def __init__(self, lexicon):
+        assert len(lexicon.symbols) < 255, 'phoneme ids must fit in a byte next to the end marker'
+        self.symbol_ids = lexicon.symbol_ids
+        self.order = lexicon.by_pronunciation  # sorted position -> entry index
+        phoneme_ids, offsets = lexicon.phoneme_arrays()
+        order = np.frombuffer(self.order, dtype=np.uint32)
+        starts, lengths = offsets[:-1][order], np.diff(offsets)[order]
+        self.columns = []  # depth -> every sorted entry's phoneme id there plus one, or 0 past its end
+        for depth in range(int(lengths.max(initial=0))):
+            column = np.zeros(len(order), dtype=np.uint8)
+            longer = lengths > depth
+            column[longer] = phoneme_ids[starts[longer] + depth] + 1
+            self.columns.append(column.tobytes())
+
+    def prefix_matches(self, phonemes: list[str], start: int = 0) -> list[int]:
+        """ indices of every entry whose phonemes are a prefix of phonemes[start:], in ascending (preference) order """
+        low, high = 0, len(self.order)
+        matches = []
+        for depth, column in enumerate(self.columns):
+            ended = bisect_right(column, 0, low, high)  # entries that end at this node
+            matches.extend(self.order[low:ended])
+            symbol = self.symbol_ids.get(phonemes[start + depth]) if start + depth < len(phonemes) else None
+            if symbol is None:
+                break
+            low, high = bisect_left(column, symbol + 1, ended, high), bisect_right(column, symbol + 1, ended, high)
+            if low == high:
+                break
+        else:
+            matches.extend(self.order[low:high])  # as long as the longest entries
+        matches.sort()  # walking the trie yields the shortest words first, restore the original order
+        return matches